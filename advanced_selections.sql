@@ -1,39 +1,35 @@
+/* выборки используют индексы и материализованные представления из scheme_indexes.sql */
+
 /* количество исполнителей в каждом жанре */
-SELECT g.genre_title, count(a.artist_id) c FROM artist_genres ag 
-RIGHT JOIN artists a ON a.artist_id = ag.artist_id 
-RIGHT JOIN genres g ON g.genre_id = ag.genre_id
-GROUP BY g.genre_title
+SELECT genre_title, artist_count c FROM genre_artist_counts
 ORDER BY c DESC;
 
 /* количество треков, вошедших в альбомы 2019-2020 годов */
-SELECT count(track_id) FROM albums
-JOIN tracks ON tracks.album_id = albums.album_id 
+SELECT COALESCE(sum(track_count), 0) FROM album_stats
 WHERE album_year IN (2019,2020);
  
 /* средняя продолжительность треков по каждому альбому */
-SELECT a.album_title, AVG(t.duration) FROM tracks t 
-JOIN albums a ON a.album_id = t.album_id 
-GROUP BY a.album_title
-ORDER BY a.album_title;
+SELECT album_title, avg_duration FROM album_stats
+WHERE track_count > 0
+ORDER BY album_title;
 
 /* все исполнители, которые не выпустили альбомы в 2020 году */
-SELECT artists.alias FROM (
-	SELECT aa.artist_id FROM album_artists aa 
+SELECT ar.alias FROM artists ar
+WHERE NOT EXISTS (
+	SELECT 1 FROM album_artists aa 
 	JOIN albums a ON aa.album_id = a.album_id 
-	WHERE a.album_year = 2020
-) a
-RIGHT JOIN artists ON artists.artist_id = a.artist_id 
-WHERE a.artist_id IS NULL;
+	WHERE aa.artist_id = ar.artist_id AND a.album_year = 2020
+);
 
 /* названия сборников, в которых присутствует конкретный исполнитель (выберите сами) */
-SELECT DISTINCT c.collection_title FROM (
-	SELECT t.track_id FROM album_artists aa 
+SELECT c.collection_title FROM collections c
+WHERE EXISTS (
+	SELECT 1 FROM collection_tracks ct
+	JOIN tracks t ON t.track_id = ct.track_id
+	JOIN album_artists aa ON aa.album_id = t.album_id
 	JOIN artists a ON a.artist_id = aa.artist_id
-	JOIN tracks t ON t.album_id = aa.album_id
-	WHERE a.alias = 'Eminem'
-) t
-JOIN collection_tracks ct ON t.track_id = ct.track_id 
-JOIN collections c ON c.collection_id = ct.collection_id;
+	WHERE ct.collection_id = c.collection_id AND a.alias = 'Eminem'
+);
 
 /* название альбомов, в которых присутствуют исполнители более 1 жанра */
 SELECT albums.album_title FROM (
@@ -46,25 +42,17 @@ JOIN album_artists aa ON a.artist_id = aa.artist_id
 JOIN albums ON albums.album_id = aa.album_id;
 
 /* наименование треков, которые не входят в сборники */
-SELECT t.track_title FROM collection_tracks ct 
-RIGHT JOIN tracks t ON t.track_id = ct.track_id 
-WHERE ct.track_id IS NULL;
+SELECT t.track_title FROM tracks t
+WHERE NOT EXISTS (
+	SELECT 1 FROM collection_tracks ct WHERE ct.track_id = t.track_id
+);
 
 /* исполнителя(-ей), написавшего самый короткий по продолжительности трек (теоретически таких треков может быть несколько) */
-SELECT a.alias FROM (
-	SELECT MIN(duration) min_duration FROM tracks
-) x 
-JOIN tracks t ON x.min_duration = t.duration 
+SELECT a.alias FROM tracks t 
 JOIN album_artists aa ON aa.album_id = t.album_id 
-JOIN artists a ON aa.artist_id = a.artist_id;
+JOIN artists a ON aa.artist_id = a.artist_id
+WHERE t.duration = (SELECT MIN(duration) FROM tracks);
 
 /* название альбомов, содержащих наименьшее количество треков. */
-WITH track_count AS (
-	SELECT count(track_id) cnt, album_id FROM tracks
-	GROUP BY album_id
-)
-SELECT albums.album_title FROM track_count
-JOIN albums ON albums.album_id = track_count.album_id
-WHERE cnt = (SELECT min(cnt) FROM track_count)
-
-
+SELECT album_title FROM album_stats
+WHERE track_count = (SELECT min(track_count) FROM album_stats WHERE track_count > 0)
@@ -0,0 +1,272 @@
+import datetime
+import sqlalchemy
+from sqlalchemy.dialects import postgresql, sqlite
+from model import Base, Book, Publisher, Sale, Shop, Stock
+
+ROLLUP_BATCH_SIZE = 50000
+# sale IDs are taken from the sequence before the transaction commits, a skipped ID is rechecked for this long
+ROLLUP_GAP_TIMEOUT = datetime.timedelta(hours=1)
+TOP_SIZE = 10
+# dialects with INSERT ... ON CONFLICT used to add the sales to the rollups
+ROLLUP_DIALECTS = {'postgresql': postgresql, 'sqlite': sqlite}
+
+
+class SaleDailyBook(Base):
+    __tablename__ = 'sale_daily_book'
+
+    day = sqlalchemy.Column(sqlalchemy.Date, primary_key=True)
+    id_book = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey("book.id"), primary_key=True, index=True)
+    units = sqlalchemy.Column(sqlalchemy.Integer, nullable=False)
+    revenue = sqlalchemy.Column(sqlalchemy.Float, nullable=False)
+
+
+class SaleDailyPublisher(Base):
+    __tablename__ = 'sale_daily_publisher'
+
+    day = sqlalchemy.Column(sqlalchemy.Date, primary_key=True)
+    id_publisher = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey("publisher.id"), primary_key=True,
+                                     index=True)
+    units = sqlalchemy.Column(sqlalchemy.Integer, nullable=False)
+    revenue = sqlalchemy.Column(sqlalchemy.Float, nullable=False)
+
+
+class SaleDailyShop(Base):
+    __tablename__ = 'sale_daily_shop'
+
+    day = sqlalchemy.Column(sqlalchemy.Date, primary_key=True)
+    id_shop = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey("shop.id"), primary_key=True, index=True)
+    units = sqlalchemy.Column(sqlalchemy.Integer, nullable=False)
+    revenue = sqlalchemy.Column(sqlalchemy.Float, nullable=False)
+
+
+class RollupState(Base):
+    __tablename__ = 'rollup_state'
+
+    name = sqlalchemy.Column(sqlalchemy.Text, primary_key=True)
+    last_sale_id = sqlalchemy.Column(sqlalchemy.Integer, nullable=False, default=0)
+
+
+class RollupGap(Base):
+    __tablename__ = 'rollup_gap'
+
+    name = sqlalchemy.Column(sqlalchemy.Text, primary_key=True)
+    first_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+    last_id = sqlalchemy.Column(sqlalchemy.Integer, nullable=False)
+    created_at = sqlalchemy.Column(sqlalchemy.DateTime, nullable=False)
+
+
+# rollup table -> (column of the rollup key, expression of the key over the sale joined with stock and book)
+ROLLUPS = {
+    SaleDailyBook: (SaleDailyBook.id_book, Stock.id_book),
+    SaleDailyPublisher: (SaleDailyPublisher.id_publisher, Book.id_publisher),
+    SaleDailyShop: (SaleDailyShop.id_shop, Stock.id_shop),
+}
+ROLLUP_STATE_NAME = 'sale_daily'
+
+
+def upsert_rollup(session: sqlalchemy.orm.session.Session, rollup, key_column, key, condition):
+    """
+    :param session: SQLAlchemy session
+    :param rollup: rollup model (one of ROLLUPS)
+    :param key_column: column of the rollup key
+    :param key: expression of the key over the sale joined with stock and book
+    :param condition: condition of the sales added to the rollup
+    :return: aggregates the sales by day and key and adds them to the existing rows with one INSERT ... SELECT
+    """
+    day = sqlalchemy.func.date(Sale.date_sale)
+    select = (
+        sqlalchemy.select(day, key, sqlalchemy.func.sum(Sale.count), sqlalchemy.func.sum(Sale.price * Sale.count))
+        .select_from(Sale)
+        .join(Stock, Stock.id == Sale.id_stock)
+        .join(Book, Book.id == Stock.id_book)
+        .where(condition, Sale.date_sale.isnot(None))
+        .group_by(day, key)
+    )
+    insert = ROLLUP_DIALECTS[session.get_bind().dialect.name].insert(rollup)
+    insert = insert.from_select([rollup.day, key_column, rollup.units, rollup.revenue], select)
+    session.execute(insert.on_conflict_do_update(
+        index_elements=[rollup.day, key_column],
+        set_={
+            'units': rollup.units + insert.excluded.units,
+            'revenue': rollup.revenue + insert.excluded.revenue,
+        }
+    ))
+
+
+def missing_ranges(ids: list, first_id: int, last_id: int):
+    """
+    :param ids: sorted IDs between first_id and last_id
+    :return: list of (first, last) ranges of the IDs from first_id to last_id not in ids
+    """
+    ranges = []
+    for sale_id in [*ids, last_id + 1]:
+        if sale_id > first_id:
+            ranges.append((first_id, sale_id - 1))
+        first_id = sale_id + 1
+    return ranges
+
+
+def update_gaps(session: sqlalchemy.orm.session.Session, now: datetime.datetime, timeout: datetime.timedelta):
+    """
+    :param session: SQLAlchemy session
+    :param now: current time
+    :param timeout: time after which a gap is considered to be left by a rolled back transaction
+    :return: adds the sales committed in the gaps below the high-water mark to the rollups, narrows the gaps to the
+    still missing IDs and forgets the gaps older than timeout, returns the number of sales
+    """
+    session.execute(sqlalchemy.delete(RollupGap).where(
+        RollupGap.name == ROLLUP_STATE_NAME, RollupGap.created_at < now - timeout
+    ))
+    gaps = session.execute(
+        sqlalchemy.select(RollupGap).where(RollupGap.name == ROLLUP_STATE_NAME)
+    ).scalars().all()
+    if not gaps:
+        return 0
+    ids = session.execute(
+        sqlalchemy.select(Sale.id)
+        .where(sqlalchemy.or_(*[Sale.id.between(gap.first_id, gap.last_id) for gap in gaps]))
+        .order_by(Sale.id)
+    ).scalars().all()
+    if not ids:
+        return 0
+    for rollup, (key_column, key) in ROLLUPS.items():
+        upsert_rollup(session, rollup, key_column, key, Sale.id.in_(ids))
+    for gap in gaps:
+        found = [sale_id for sale_id in ids if gap.first_id <= sale_id <= gap.last_id]
+        if not found:
+            continue
+        session.delete(gap)
+        session.flush()
+        session.add_all([
+            RollupGap(name=ROLLUP_STATE_NAME, first_id=first, last_id=last, created_at=gap.created_at)
+            for first, last in missing_ranges(found, gap.first_id, gap.last_id)
+        ])
+    return len(ids)
+
+
+def update_rollups(session: sqlalchemy.orm.session.Session, batch_size: int = ROLLUP_BATCH_SIZE,
+                   gap_timeout: datetime.timedelta = ROLLUP_GAP_TIMEOUT):
+    """
+    :param session: SQLAlchemy session (PostgreSQL or SQLite)
+    :param batch_size: max number of sales added to the rollups in one transaction
+    :param gap_timeout: how long a missing sale ID below the high-water mark is waited for
+    :return: adds the sales created since the previous call to the daily rollups, returns the number of sales;
+    the sales are taken in ID order after the high-water mark stored in rollup_state. A sale ID is taken from
+    the sequence before its transaction commits, so a sale with a lower ID may become visible after the mark has
+    passed it: the missing IDs below the mark are kept in rollup_gap and the sales committed in them are added
+    on the next calls. Each sale is counted exactly once if it commits within gap_timeout after the mark passed its ID
+    (later ones are never counted); the sales should not be changed after they were added and sales without
+    date_sale are not counted
+    """
+    if session.get_bind().dialect.name not in ROLLUP_DIALECTS:
+        raise Exception('Sale rollups require PostgreSQL or SQLite')
+    total = 0
+    while True:
+        state = session.execute(
+            sqlalchemy.select(RollupState).where(RollupState.name == ROLLUP_STATE_NAME).with_for_update()
+        ).scalar_one_or_none()
+        if state is None:
+            state = RollupState(name=ROLLUP_STATE_NAME, last_sale_id=0)
+            session.add(state)
+        now = datetime.datetime.now()
+        if not total:
+            total += update_gaps(session, now, gap_timeout)
+        ids = session.execute(
+            sqlalchemy.select(Sale.id).where(Sale.id > state.last_sale_id).order_by(Sale.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            session.commit()
+            return total
+        condition = sqlalchemy.and_(Sale.id > state.last_sale_id, Sale.id <= ids[-1])
+        for rollup, (key_column, key) in ROLLUPS.items():
+            upsert_rollup(session, rollup, key_column, key, condition)
+        session.add_all([
+            RollupGap(name=ROLLUP_STATE_NAME, first_id=first, last_id=last, created_at=now)
+            for first, last in missing_ranges(ids, state.last_sale_id + 1, ids[-1])
+        ])
+        state.last_sale_id = ids[-1]
+        session.commit()
+        total += len(ids)
+
+
+def refresh_days(session: sqlalchemy.orm.session.Session, days: set):
+    """
+    :param session: SQLAlchemy session (PostgreSQL or SQLite)
+    :param days: days of the sales changed after they were added to the rollups
+    :return: recomputes the rollup rows of the days from the sales already added (up to the high-water mark
+    and outside of the gaps, the rest is added by update_rollups), returns the number of days
+    """
+    state = session.execute(
+        sqlalchemy.select(RollupState).where(RollupState.name == ROLLUP_STATE_NAME).with_for_update()
+    ).scalar_one_or_none()
+    if state is None or not days:
+        session.commit()
+        return 0
+    gaps = session.execute(
+        sqlalchemy.select(RollupGap).where(RollupGap.name == ROLLUP_STATE_NAME)
+    ).scalars().all()
+    condition = sqlalchemy.and_(
+        sqlalchemy.func.date(Sale.date_sale).in_(days), Sale.id <= state.last_sale_id,
+        *[~Sale.id.between(gap.first_id, gap.last_id) for gap in gaps]
+    )
+    for rollup, (key_column, key) in ROLLUPS.items():
+        session.execute(sqlalchemy.delete(rollup).where(rollup.day.in_(days)))
+        upsert_rollup(session, rollup, key_column, key, condition)
+    session.commit()
+    return len(days)
+
+
+def top(session: sqlalchemy.orm.session.Session, rollup, key_column, name, date_from: datetime.date = None,
+        date_to: datetime.date = None, limit: int = TOP_SIZE, by: str = 'revenue'):
+    """
+    :param session: SQLAlchemy session
+    :param rollup: rollup model (one of ROLLUPS)
+    :param key_column: column of the rollup key
+    :param name: column with the name of the key (joined by key_column foreign key)
+    :param date_from: first day of the range (None - unlimited)
+    :param date_to: last day of the range (None - unlimited)
+    :param limit: number of rows
+    :param by: revenue or units
+    :return: list of (name, units, revenue) ordered by the specified value descending
+    """
+    if by not in ['revenue', 'units']:
+        raise Exception(f'Unknown parameter {by}')
+    units = sqlalchemy.func.sum(rollup.units).label('units')
+    revenue = sqlalchemy.func.sum(rollup.revenue).label('revenue')
+    query = (
+        sqlalchemy.select(name, units, revenue)
+        .join_from(rollup, name.class_, key_column == name.class_.id)
+        .group_by(name.class_.id, name)
+        .order_by((revenue if by == 'revenue' else units).desc(), name)
+        .limit(limit)
+    )
+    if date_from:
+        query = query.where(rollup.day >= date_from)
+    if date_to:
+        query = query.where(rollup.day <= date_to)
+    return session.execute(query).all()
+
+
+def top_books(session: sqlalchemy.orm.session.Session, date_from: datetime.date = None,
+              date_to: datetime.date = None, limit: int = TOP_SIZE, by: str = 'revenue'):
+    """
+    :return: list of (book title, units, revenue), parameters are the same as in top
+    """
+    return top(session, SaleDailyBook, SaleDailyBook.id_book, Book.title, date_from, date_to, limit, by)
+
+
+def top_publishers(session: sqlalchemy.orm.session.Session, date_from: datetime.date = None,
+                   date_to: datetime.date = None, limit: int = TOP_SIZE, by: str = 'revenue'):
+    """
+    :return: list of (publisher name, units, revenue), parameters are the same as in top
+    """
+    return top(session, SaleDailyPublisher, SaleDailyPublisher.id_publisher, Publisher.name, date_from, date_to,
+               limit, by)
+
+
+def top_shops(session: sqlalchemy.orm.session.Session, date_from: datetime.date = None,
+              date_to: datetime.date = None, limit: int = TOP_SIZE, by: str = 'revenue'):
+    """
+    :return: list of (shop name, units, revenue), parameters are the same as in top
+    """
+    return top(session, SaleDailyShop, SaleDailyShop.id_shop, Shop.name, date_from, date_to, limit, by)
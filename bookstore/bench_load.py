@@ -0,0 +1,39 @@
+import argparse
+import os
+import time
+import sqlalchemy
+import loader
+import model
+import parallel
+from main import DB_TYPE, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME, TEST_DATA_FILE_PATH
+
+
+def measure(engine, load):
+    """
+    :param engine: SQLAlchemy engine
+    :param load: function loading the fixture and returning {table_name: row_count}
+    :return: (row count, seconds) of loading into the recreated tables
+    """
+    model.create_tables(engine)
+    started = time.perf_counter()
+    counts = load()
+    return sum(counts.values()), time.perf_counter() - started
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares bulk loading with parallel loading on 1..N workers')
+    parser.add_argument('--fixture', default=TEST_DATA_FILE_PATH,
+                        help='large fixture, e.g. generated by datagen/main.py bookstore --format jsonl')
+    parser.add_argument('--workers', default=','.join(str(2 ** i) for i in range(8) if 2 ** i <= os.cpu_count()),
+                        help='comma separated numbers of workers')
+    args = parser.parse_args()
+
+    DSN = f'{DB_TYPE.lower()}://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+    engine = sqlalchemy.create_engine(DSN)
+    results = [('bulk', *measure(engine, lambda: loader.bulk_load(engine, loader.iter_fixture(args.fixture))))]
+    for workers in [int(value) for value in args.workers.split(',')]:
+        results.append((f'parallel x{workers}',
+                        *measure(engine, lambda: parallel.parallel_load(engine, args.fixture, workers))))
+    print(f'{"mode":<14} {"rows":>10} {"seconds":>8} {"rows/s":>10} {"speedup":>8}')
+    for name, rows, elapsed in results:
+        print(f'{name:<14} {rows:>10} {elapsed:>8.2f} {rows / elapsed:>10.0f} {results[0][2] / elapsed:>8.2f}')
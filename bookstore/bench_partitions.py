@@ -0,0 +1,85 @@
+import argparse
+import datetime
+import sys
+import time
+import sqlalchemy
+import partitions
+from main import DB_TYPE, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME
+
+RUNS = 5
+# name -> (date-bounded query over sale, number of days from the first day of the month)
+QUERIES = {
+    'month revenue': ('SELECT sum(price * count) FROM sale WHERE date_sale >= :start AND date_sale < :end', 31),
+    'week sales by stock': ('''
+        SELECT id_stock, count(*), sum(count) FROM sale
+        WHERE date_sale >= :start AND date_sale < :end GROUP BY id_stock
+    ''', 7),
+    'day between': ('SELECT count(*) FROM sale WHERE date_sale BETWEEN :start AND :end', 1),
+}
+
+
+def scanned_relations(plan: dict):
+    """
+    :param plan: node of EXPLAIN (FORMAT JSON)
+    :return: set of the relations read by the plan
+    """
+    result = {plan['Relation Name']} if 'Relation Name' in plan else set()
+    for child in plan.get('Plans', []):
+        result |= scanned_relations(child)
+    return result
+
+
+def query_bounds(month: datetime.date, days: int):
+    """
+    :param month: first day of the month
+    :param days: number of days of the query (QUERIES)
+    :return: {'start': ..., 'end': ...} parameters of the query
+    """
+    start = datetime.datetime.combine(month, datetime.time())
+    return {'start': start, 'end': start + datetime.timedelta(days=days)}
+
+
+def measure(connection, query: str, params: dict, runs: int):
+    """
+    :return: (scanned relations, average milliseconds)
+    """
+    plan = connection.execute(sqlalchemy.text(f'EXPLAIN (FORMAT JSON) {query}'), params).scalar()
+    started = time.perf_counter()
+    for _ in range(runs):
+        connection.execute(sqlalchemy.text(query), params).all()
+    return scanned_relations(plan[0]['Plan']), (time.perf_counter() - started) * 1000 / runs
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Checks partition pruning of date-bounded sale queries')
+    parser.add_argument('--month', help='YYYY-MM, the busiest month by default')
+    parser.add_argument('--runs', type=int, default=RUNS)
+    args = parser.parse_args()
+
+    DSN = f'{DB_TYPE.lower()}://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+    engine = sqlalchemy.create_engine(DSN)
+    partitions.check_partitioned(engine)
+    failed = False
+    with engine.connect() as connection:
+        items = partitions.partitions(connection)
+        if args.month:
+            month = datetime.date.fromisoformat(f'{args.month}-01')
+        else:
+            month = connection.execute(sqlalchemy.text('''
+                SELECT CAST(date_trunc('month', date_sale) AS date) FROM sale GROUP BY 1 ORDER BY count(*) DESC LIMIT 1
+            ''')).scalar() or partitions.month_start(datetime.date.today())
+        print(f'Секций: {len(items)}, месяц: {month:%Y-%m}')
+        print(f'{"query":<22} {"scanned":>8} {"expected":>9} {"ms":>9}  partitions')
+        for name, (query, days) in QUERIES.items():
+            params = query_bounds(month, days)
+            expected = {
+                item for item, first, after in items
+                if first < params['end'].date() + datetime.timedelta(days=1) and after > params['start'].date()
+            } | {partitions.DEFAULT_PARTITION}
+            relations, elapsed = measure(connection, query, params, args.runs)
+            print(f'{name:<22} {len(relations):>8} {len(expected):>9} {elapsed:>9.2f}  {", ".join(sorted(relations))}')
+            failed = failed or not relations <= expected
+    if failed:
+        print('Запросы читают секции вне диапазона дат')
+        sys.exit(1)
+    print('Секции вне диапазона дат отсечены')
@@ -0,0 +1,126 @@
+import argparse
+import datetime
+import random
+import threading
+import time
+import sqlalchemy
+from sqlalchemy.orm import sessionmaker
+import model
+import sales
+from main import DB_TYPE, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME
+from model import Publisher, Shop, Book, Stock, Sale
+
+THREADS = 8
+STOCK_ROWS = 20
+STOCK_COUNT = 1000
+BATCH_SIZE = 20
+
+
+def prepare(engine, stock_rows: int, stock_count: int):
+    """
+    :param engine: SQLAlchemy engine
+    :param stock_rows: number of stock rows
+    :param stock_count: initial number of books in each stock row
+    :return: recreates the tables with one publisher, shop and a book per stock row
+    """
+    model.create_tables(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([Publisher(id=1, name='Publisher'), Shop(id=1, name='Shop')])
+    session.add_all([Book(id=i, title=f'Book {i}', id_publisher=1) for i in range(1, stock_rows + 1)])
+    session.add_all([Stock(id=i, id_book=i, id_shop=1, count=stock_count) for i in range(1, stock_rows + 1)])
+    session.commit()
+    session.close()
+
+
+def orm_sales(session, batch: list):
+    """
+    read-modify-write through the ORM without locks, kept for comparison (it oversells under concurrency)
+    """
+    result = []
+    for sale in batch:
+        stock = session.get(Stock, sale['id_stock'])
+        if stock.count >= sale['count']:
+            stock.count -= sale['count']
+            session.add(Sale(**sale))
+            result.append(True)
+        else:
+            result.append(None)
+        session.commit()
+    return result
+
+
+def single_sales(session, batch: list):
+    result = []
+    for sale in batch:
+        try:
+            result.append(sales.record_sale(session, **sale))
+        except sales.OutOfStock:
+            result.append(None)
+    return result
+
+
+MODES = {'orm': orm_sales, 'single': single_sales, 'batch': sales.record_sales}
+
+
+def worker(engine, mode: str, stock_rows: int, batch_size: int, seed: int, counters: list):
+    """
+    :return: sells random books in batches until a whole batch is rejected, adds the number of sold and rejected
+    sales to counters
+    """
+    rng = random.Random(seed)
+    session = sessionmaker(bind=engine)()
+    while True:
+        batch = [{'id_stock': rng.randint(1, stock_rows), 'count': rng.randint(1, 3), 'price': 10.0,
+                  'date_sale': datetime.datetime.now()} for _ in range(batch_size)]
+        result = MODES[mode](session, batch)
+        sold = sum(1 for item in result if item is not None)
+        counters[0] += sold
+        counters[1] += len(result) - sold
+        if not sold:
+            break
+    session.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sells all the stock from several threads and checks for oversell')
+    parser.add_argument('--mode', choices=list(MODES), default='batch')
+    parser.add_argument('--threads', type=int, default=THREADS)
+    parser.add_argument('--stock-rows', type=int, default=STOCK_ROWS)
+    parser.add_argument('--stock-count', type=int, default=STOCK_COUNT)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    DSN = f'{DB_TYPE.lower()}://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+    engine = sqlalchemy.create_engine(DSN, pool_size=args.threads)
+    prepare(engine, args.stock_rows, args.stock_count)
+    counters = [[0, 0] for _ in range(args.threads)]
+    threads = [
+        threading.Thread(target=worker, args=(engine, args.mode, args.stock_rows, args.batch_size, i, counters[i]))
+        for i in range(args.threads)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    sold = sum(item[0] for item in counters)
+    print(f'{args.mode}: продано {sold} раз за {elapsed:.2f} с ({sold / elapsed:.0f} продаж/с), '
+          f'отклонено {sum(item[1] for item in counters)}')
+
+    with engine.connect() as connection:
+        rows = connection.execute(sqlalchemy.text('''
+            SELECT stock.id, stock.count, COALESCE(SUM(sale.count), 0), COUNT(sale.id)
+            FROM stock LEFT JOIN sale ON sale.id_stock = stock.id
+            GROUP BY stock.id
+        ''')).all()
+    oversold = [
+        (stock_id, count, sold_books) for stock_id, count, sold_books, _ in rows
+        if count < 0 or count + sold_books != args.stock_count
+    ]
+    print(f'Записано продаж: {sum(row[3] for row in rows)}, продано книг: {sum(row[2] for row in rows)} '
+          f'из {args.stock_rows * args.stock_count}')
+    if oversold:
+        print(f'Перепродажа или расхождение остатков: {len(oversold)} позиций, например {oversold[:3]}')
+    else:
+        print('Остатки сходятся с продажами, перепродаж нет')
@@ -0,0 +1,78 @@
+import argparse
+import datetime
+import os
+import sys
+import time
+import sqlalchemy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from copyexport import FORMATS, RANGES, open_output, guess_format, snapshot, copy_query, id_ranges, missing_ids, \
+    read_state, write_state
+
+SALES_QUERY = '''
+    SELECT sale.id, sale.date_sale, sale.price, sale.count, sale.id_stock,
+        stock.id_book, book.title AS book_title,
+        book.id_publisher, publisher.name AS publisher_name,
+        stock.id_shop, shop.name AS shop_name
+    FROM sale
+    JOIN stock ON stock.id = sale.id_stock
+    JOIN book ON book.id = stock.id_book
+    JOIN publisher ON publisher.id = book.id_publisher
+    JOIN shop ON shop.id = stock.id_shop
+    {ranges}
+    WHERE %(since_date)s IS NULL OR sale.date_sale >= %(since_date)s
+'''.format(ranges=RANGES.format(id='sale.id'))
+
+
+def export_sales(engine: sqlalchemy.engine.Engine, path: str, format: str = 'csv', since_id: int = 0,
+                 since_date: datetime.datetime = None, gaps: list = None):
+    """
+    :param engine: SQLAlchemy engine (PostgreSQL)
+    :param path: output file, gzip compressed if it ends with .gz, - for stdout
+    :param format: csv or jsonl
+    :param since_id: export the sales with ID greater than this one (the last_id of the previous export)
+    :param since_date: export the sales made since this date (prunes the partitions of a partitioned sale table)
+    :param gaps: gaps of the previous export, the sales committed in them are exported too
+    :return: streams the sales with their book, publisher and shop into the file with COPY TO in a read-only
+    REPEATABLE READ transaction, so the ID bound and the rows are read from one snapshot; the rows are not ordered,
+    the memory use does not depend on the number of sales; returns {'rows': ..., 'last_id': ..., 'gaps': ...}.
+    A sale ID is taken before the transaction commits, so a sale committed later may have an ID below last_id:
+    the missing IDs are returned as gaps, a sale is exported exactly once if it commits within
+    copyexport.GAP_TIMEOUT and the gaps are passed to the next export
+    """
+    if engine.dialect.name != 'postgresql':
+        raise Exception('Export requires PostgreSQL')
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cur, open_output(path) as output:
+            snapshot(cur)
+            last_id, params = id_ranges(cur, 'sale', since_id, gaps)
+            rows = copy_query(cur, SALES_QUERY, {**params, 'since_date': since_date}, output, format)
+            gaps = missing_ids(cur, 'sale', params)
+        connection.commit()
+    finally:
+        connection.close()
+    return {'rows': rows, 'last_id': last_id, 'gaps': gaps}
+
+
+if __name__ == '__main__':
+    from main import DB_TYPE, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME
+
+    parser = argparse.ArgumentParser(description='Exports sales with their books, publishers and shops')
+    parser.add_argument('output', help='file (.gz - compressed) or - for stdout')
+    parser.add_argument('--format', choices=FORMATS, help='by the file extension by default')
+    parser.add_argument('--since-id', type=int, default=0, help='last_id of the previous export')
+    parser.add_argument('--since-date', type=datetime.datetime.fromisoformat, help='YYYY-MM-DD[ HH:MM:SS]')
+    parser.add_argument('--state', help='JSON file with last_id and gaps, read before and written after the export')
+    args = parser.parse_args()
+
+    DSN = f'{DB_TYPE.lower()}://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+    engine = sqlalchemy.create_engine(DSN)
+    started = time.perf_counter()
+    state = read_state(args.state) if args.state else {'last_id': args.since_id, 'gaps': []}
+    result = export_sales(engine, args.output, args.format or guess_format(args.output), state['last_id'],
+                          args.since_date, state['gaps'])
+    if args.state:
+        write_state(args.state, result)
+    print(f'Выгружено продаж: {result["rows"]} за {time.perf_counter() - started:.2f} с, '
+          f'последний ID: {result["last_id"]}', file=sys.stderr)
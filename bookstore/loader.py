@@ -0,0 +1,361 @@
+import datetime
+import io
+import json
+import re
+import tempfile
+import time
+import psycopg2.extras
+import sqlalchemy
+import sqlalchemy.orm
+from sqlalchemy.dialects import postgresql
+import analytics
+import model
+
+READ_CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_SIZE = 64 * 1024 * 1024
+WHITESPACE = re.compile(r'\s*')
+# table -> columns identifying a row in sync mode, tables keyed by other columns than id get their own ids;
+# sales are keyed by (id, date_sale) when the table is partitioned
+SYNC_KEYS = {
+    'publisher': ['name'],
+    'shop': ['name'],
+    'book': ['id'],
+    'stock': ['id_book', 'id_shop'],
+    'sale': [column.name for column in model.Sale.__table__.primary_key],
+}
+
+
+def iter_fixture(path: str, chunk_size: int = READ_CHUNK_SIZE):
+    """
+    :param path: path to the fixture file, a JSON array of items or JSON Lines (one item per line)
+    :param chunk_size: number of characters read from the file at once
+    :return: yields fixture items like {"model": ..., "pk": ..., "fields": {...}} one at a time,
+    the file is parsed incrementally so memory usage does not depend on the file size
+    """
+    decoder = json.JSONDecoder()
+    with open(path) as file:
+        buffer, position = file.read(chunk_size), 0
+
+        def next_char():
+            nonlocal buffer, position
+            while True:
+                position = WHITESPACE.match(buffer, position).end()
+                if position < len(buffer):
+                    return buffer[position]
+                buffer, position = file.read(chunk_size), 0
+                if not buffer:
+                    return ''
+
+        char = next_char()
+        if not char:
+            return
+        if char != '[':
+            file.seek(0)
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        position += 1
+        if next_char() == ']':
+            return
+        while True:
+            next_char()
+            while True:
+                try:
+                    item, position = decoder.raw_decode(buffer, position)
+                    break
+                except json.JSONDecodeError:
+                    chunk = file.read(chunk_size)
+                    if not chunk:
+                        raise
+                    buffer, position = buffer[position:] + chunk, 0
+            yield item
+            char = next_char()
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError(f'Unexpected {char or "end of file"!r} in the fixture, expected "," or "]"')
+            position += 1
+
+
+def copy_text(value):
+    """
+    :param value: python value
+    :return: value encoded for the PostgreSQL COPY text format
+    """
+    if value is None:
+        return '\\N'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def fixture_row(item: dict):
+    """
+    :param item: fixture item
+    :return: table name and a row dict with the primary key included (if present in the fixture)
+    """
+    table = model.Base.metadata.tables.get(item['model'].lower())
+    if table is None:
+        raise ValueError(f'Unknown model {item["model"]}')
+    row = dict(item['fields'])
+    if item.get('pk') is not None:
+        row['id'] = item['pk']
+    unknown = set(row) - set(table.columns.keys())
+    if unknown:
+        raise ValueError(f'Unknown fields for model {item["model"]}: {", ".join(sorted(unknown))}')
+    return table.name, row
+
+
+def spool_fixture(items):
+    """
+    :param items: iterable of fixture items
+    :return: {table_name: (file, row_count)}, rows are spooled per table as JSON lines
+    so that they can be loaded later in the foreign key dependency order
+    """
+    spool = {}
+    for item in items:
+        table_name, row = fixture_row(item)
+        if table_name not in spool:
+            spool[table_name] = [tempfile.SpooledTemporaryFile(SPOOL_MAX_SIZE, mode='w+'), 0]
+        spool[table_name][0].write(json.dumps(row) + '\n')
+        spool[table_name][1] += 1
+    return {table_name: (file, count) for table_name, (file, count) in spool.items()}
+
+
+def read_batches(file, batch_size: int):
+    """
+    :param file: spooled file with JSON lines
+    :param batch_size: max number of rows in a batch
+    :return: yields lists of row dicts
+    """
+    file.seek(0)
+    batch = []
+    for line in file:
+        batch.append(json.loads(line))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def batch_columns(table: sqlalchemy.Table, rows: list):
+    """
+    :param table: target table
+    :param rows: list of row dicts
+    :return: columns of the table present in any of the rows, in the table order
+    """
+    keys = set().union(*rows)
+    return [column for column in table.columns.keys() if column in keys]
+
+
+def copy_rows(cursor, table: sqlalchemy.Table, rows: list):
+    """
+    :param cursor: DBAPI (psycopg2) cursor
+    :param table: target table
+    :param rows: list of row dicts, a column missing in some of the rows is written as NULL to them
+    :return: writes rows to the table with COPY FROM STDIN
+    """
+    columns = batch_columns(table, rows)
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(copy_text(row.get(column)) for column in columns) + '\n')
+    buffer.seek(0)
+    cursor.copy_expert(f'COPY {table.name} ({", ".join(columns)}) FROM STDIN', buffer)
+
+
+def python_row(table: sqlalchemy.Table, row: dict):
+    """
+    :param table: target table
+    :param row: row dict decoded from JSON
+    :return: row with ISO 8601 strings converted to datetime for DateTime columns
+    """
+    return {
+        key: datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if isinstance(value, str) and isinstance(table.columns[key].type, sqlalchemy.DateTime) else value
+        for key, value in row.items()
+    }
+
+
+def reset_sequence(connection, table: sqlalchemy.Table):
+    """
+    :param connection: SQLAlchemy connection
+    :param table: table with a serial id column
+    :return: moves the id sequence past the ids loaded explicitly
+    """
+    connection.execute(sqlalchemy.text(
+        f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), MAX(id)) FROM {table.name}"
+    ))
+
+
+def bulk_load(engine: sqlalchemy.engine.Engine, items, batch_size: int = 10000):
+    """
+    :param engine: SQLAlchemy engine
+    :param items: iterable of fixture items
+    :param batch_size: number of rows sent to the database at once
+    :return: loads the items table by table in the foreign key dependency order
+    (COPY for PostgreSQL, batched INSERT otherwise), returns {table_name: row_count}
+    """
+    spool = spool_fixture(items)
+    is_postgresql = engine.dialect.name == 'postgresql'
+    result = {}
+    with engine.begin() as connection:
+        cursor = connection.connection.cursor() if is_postgresql else None
+        for table in model.Base.metadata.sorted_tables:
+            if table.name not in spool:
+                continue
+            file, count = spool[table.name]
+            started = time.perf_counter()
+            for batch in read_batches(file, batch_size):
+                if is_postgresql:
+                    copy_rows(cursor, table, batch)
+                else:
+                    connection.execute(table.insert(), [python_row(table, row) for row in batch])
+            if is_postgresql:
+                reset_sequence(connection, table)
+            file.close()
+            elapsed = time.perf_counter() - started
+            result[table.name] = count
+            print(f'{table.name}: загружено {count} строк за {elapsed:.2f} с ({count / (elapsed or 1e-9):.0f} строк/с)')
+    return result
+
+
+def ensure_unique_key(cursor, table: sqlalchemy.Table, key: list):
+    """
+    :param cursor: DBAPI (psycopg2) cursor
+    :param table: target table
+    :param key: columns identifying the rows (SYNC_KEYS)
+    :return: adds a unique constraint on the key columns if the table has no unique index on them
+    (tables created before the constraint was added to the model), ON CONFLICT requires it
+    """
+    cursor.execute('''
+        SELECT 1 FROM pg_index i
+        WHERE i.indrelid = CAST(%s AS regclass) AND i.indisunique AND i.indpred IS NULL AND i.indexprs IS NULL
+            AND ARRAY(SELECT a.attname::text FROM pg_attribute a
+                      WHERE a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey) ORDER BY 1) = %s
+    ''', (table.name, sorted(key)))
+    if cursor.fetchone():
+        return
+    print(f'{table.name}: добавлено ограничение уникальности ({", ".join(key)})')
+    cursor.execute(f'ALTER TABLE {table.name} ADD CONSTRAINT {table.name}_{"_".join(key)}_key UNIQUE ({", ".join(key)})')
+
+
+def upsert_rows(cursor, table: sqlalchemy.Table, rows: list, key: list):
+    """
+    :param cursor: DBAPI (psycopg2) cursor
+    :param table: target table
+    :param rows: list of row dicts, a column missing in some of the rows is written as NULL to them
+    :param key: columns of a unique constraint identifying the rows
+    :return: (inserted, updated, unchanged) counts, rows are inserted or updated with INSERT ... ON CONFLICT,
+    rows with the same content hash as in the table are not written
+    """
+    rows = list({tuple(row[column] for column in key): row for row in rows}.values())
+    # system columns like xmax cannot be returned from a partitioned table, its existing rows are counted beforehand
+    partitioned = bool(table.dialect_options['postgresql'].get('partition_by'))
+    existing = 0
+    if partitioned:
+        types = {column: table.columns[column].type.compile(dialect=postgresql.dialect()) for column in key}
+        existing = psycopg2.extras.execute_values(cursor, f"""
+            SELECT count(*) FROM {table.name} t
+            JOIN (VALUES %s) AS k ({', '.join(key)})
+                ON {' AND '.join(f't.{column} = CAST(k.{column} AS {types[column]})' for column in key)}
+        """, [[row[column] for column in key] for row in rows], page_size=len(rows), fetch=True)[0][0]
+    columns = [column for column in batch_columns(table, rows) if column != 'id' or 'id' in key]
+    values = [column for column in columns if column not in key]
+    if values:
+        conflict = f"""DO UPDATE SET {', '.join(f'{column} = EXCLUDED.{column}' for column in values)}
+            WHERE md5(ROW({', '.join(f't.{column}' for column in values)})::text)
+                <> md5(ROW({', '.join(f'EXCLUDED.{column}' for column in values)})::text)"""
+    else:
+        conflict = 'DO NOTHING'
+    flags = psycopg2.extras.execute_values(cursor, f"""
+        INSERT INTO {table.name} AS t ({', '.join(columns)}) VALUES %s
+        ON CONFLICT ({', '.join(key)}) {conflict}
+        RETURNING {'true' if partitioned else 'xmax = 0'}
+    """, [[row.get(column) for column in columns] for row in rows], page_size=len(rows), fetch=True)
+    inserted = len(rows) - existing if partitioned else sum(1 for flag, in flags if flag)
+    return inserted, len(flags) - inserted, len(rows) - len(flags)
+
+
+def fetch_ids(cursor, table: sqlalchemy.Table, keys: list, key: list):
+    """
+    :param cursor: DBAPI (psycopg2) cursor
+    :param table: table with an id column
+    :param keys: list of key tuples
+    :param key: key columns
+    :return: {key tuple: id}
+    """
+    rows = psycopg2.extras.execute_values(cursor, f"""
+        SELECT t.id, {', '.join(f't.{column}' for column in key)} FROM {table.name} t
+        JOIN (VALUES %s) AS k ({', '.join(key)}) ON {' AND '.join(f't.{column} = k.{column}' for column in key)}
+    """, keys, page_size=len(keys), fetch=True)
+    return {tuple(row[1:]): row[0] for row in rows}
+
+
+def counted_days(cursor, ids: list, last_id: int):
+    """
+    :param cursor: DBAPI (psycopg2) cursor
+    :param ids: sale IDs
+    :param last_id: high-water mark of the rollups
+    :return: set of the days of the sales with the IDs that were already added to the rollups
+    """
+    ids = [sale_id for sale_id in ids if sale_id <= last_id]
+    if not ids:
+        return set()
+    cursor.execute('SELECT DISTINCT CAST(date_sale AS date) FROM sale WHERE id = ANY(%s)', (ids,))
+    return {day for day, in cursor.fetchall() if day is not None}
+
+
+def sync_load(engine: sqlalchemy.engine.Engine, items, batch_size: int = 10000):
+    """
+    :param engine: SQLAlchemy engine (PostgreSQL)
+    :param items: iterable of fixture items
+    :param batch_size: number of rows sent to the database at once
+    :return: applies the items to the existing tables in one transaction without deleting anything:
+    rows are matched by SYNC_KEYS, new rows are inserted, changed rows are updated, foreign keys of the fixture
+    are translated to the ids of the matched rows, the missing unique constraints on SYNC_KEYS are added; returns {table_name: (inserted, updated, unchanged)};
+    the daily rollups of the days of the sales written below the rollup high-water mark are recomputed
+    """
+    if engine.dialect.name != 'postgresql':
+        raise Exception('Sync mode requires PostgreSQL')
+    spool = spool_fixture(items)
+    result, ids, stale_days = {}, {}, set()
+    with engine.begin() as connection:
+        cursor = connection.connection.cursor()
+        cursor.execute('SELECT last_sale_id FROM rollup_state WHERE name = %s', (analytics.ROLLUP_STATE_NAME,))
+        rollup_mark = (cursor.fetchone() or [0])[0]
+        for table in model.Base.metadata.sorted_tables:
+            if table.name not in spool:
+                continue
+            file, count = spool[table.name]
+            key = SYNC_KEYS[table.name]
+            ensure_unique_key(cursor, table, key)
+            references = {fk.parent.name: fk.column.table.name for fk in table.foreign_keys}
+            table_ids = ids.setdefault(table.name, {})
+            counts = [0, 0, 0]
+            started = time.perf_counter()
+            for batch in read_batches(file, batch_size):
+                for row in batch:
+                    for column, target in references.items():
+                        if column in row:
+                            row[column] = ids.get(target, {}).get(row[column], row[column])
+                sale_ids = [row['id'] for row in batch if 'id' in row] if table.name == 'sale' else []
+                days = counted_days(cursor, sale_ids, rollup_mark)
+                written = upsert_rows(cursor, table, batch, key)
+                if written[0] or written[1]:
+                    # the rollups kept the old values of the updated sales and never see the inserted ones
+                    stale_days |= days | counted_days(cursor, sale_ids, rollup_mark)
+                counts = [a + b for a, b in zip(counts, written)]
+                if 'id' not in key:
+                    found = fetch_ids(cursor, table, list({tuple(row[c] for c in key) for row in batch}), key)
+                    table_ids.update({row['id']: found[tuple(row[c] for c in key)] for row in batch if 'id' in row})
+            if 'id' in key:
+                reset_sequence(connection, table)
+            file.close()
+            elapsed = time.perf_counter() - started
+            result[table.name] = tuple(counts)
+            print(f'{table.name}: добавлено {counts[0]}, обновлено {counts[1]}, без изменений {counts[2]} '
+                  f'за {elapsed:.2f} с ({count / (elapsed or 1e-9):.0f} строк/с)')
+    if stale_days:
+        with sqlalchemy.orm.Session(engine) as session:
+            print(f'Пересчитано дней в сводных таблицах: {analytics.refresh_days(session, stale_days)}')
+    return result
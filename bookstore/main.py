@@ -1,9 +1,15 @@
 import sqlalchemy
 from sqlalchemy.orm import sessionmaker
 import model
+import loader
+import parallel
+import partitions
+import analytics
 from model import Publisher, Book, Stock, Shop
-import json
+import argparse
+import datetime
 import os
+import sys
 
 DB_TYPE = os.getenv('DB_TYPE') or 'postgresql'
 DB_NAME = os.getenv('DB_NAME') or 'postgres'
@@ -12,41 +18,127 @@ DB_PASSWORD = os.getenv('DB_PASSWORD') or 'postgres'
 DB_HOST = os.getenv('DB_HOST') or 'localhost'
 DB_PORT = os.getenv('DB_PORT') or 5432
 
+LOAD_MODE = os.getenv('LOAD_MODE') or 'orm'
+LOAD_BATCH_SIZE = int(os.getenv('LOAD_BATCH_SIZE') or 10000)
+LOAD_WORKERS = int(os.getenv('LOAD_WORKERS') or os.cpu_count() or 1)
+
 TEST_DATA_FILE_PATH = './fixtures/tests_data.json'
 
 
-def fill_in_tables(session: sqlalchemy.orm.session.Session):
-    with open(TEST_DATA_FILE_PATH) as file:
-        data = json.load(file)
-    session.add_all([
-        getattr(model, item['model'].title())(**item['fields'])
-        for item in data
-    ])
+def fill_in_tables(session: sqlalchemy.orm.session.Session, path: str = TEST_DATA_FILE_PATH,
+                   batch_size: int = LOAD_BATCH_SIZE):
+    batch = []
+    for item in loader.iter_fixture(path):
+        batch.append(getattr(model, item['model'].title())(**item['fields']))
+        if len(batch) >= batch_size:
+            session.add_all(batch)
+            session.commit()
+            batch = []
+    session.add_all(batch)
     session.commit()
 
 
+def publisher_shops_query(user_input: str, use_view: bool = True):
+    """
+    :param user_input: publisher ID or name
+    :param use_view: read the publisher_shop view (PostgreSQL only) instead of joining the tables
+    :return: select of (publisher name, shop name) for the shops selling books of the publisher
+    """
+    if use_view:
+        view = model.publisher_shop
+        return (
+            sqlalchemy.select(view.c.publisher_name, view.c.shop_name)
+            .where(view.c.id_publisher == int(user_input) if user_input.isdigit() else view.c.publisher_name == user_input)
+            .order_by(view.c.shop_name)
+        )
+    return (
+        sqlalchemy.select(Publisher.name, Shop.name)
+        .select_from(Shop)
+        .join(Stock, Stock.id_shop == Shop.id)
+        .join(Book, Book.id == Stock.id_book)
+        .join(Publisher, Book.id_publisher == Publisher.id)
+        .filter(Publisher.id == int(user_input) if user_input.isdigit() else Publisher.name == user_input)
+        .distinct(Shop.name)
+        .group_by(Publisher.name, Shop.name)
+    )
+
+
+def publisher_shops(session: sqlalchemy.orm.session.Session, user_input: str):
+    """
+    :param session: SQLAlchemy session
+    :param user_input: publisher ID or name
+    :return: list of (publisher name, shop name) for the shops selling books of the publisher,
+    on PostgreSQL it is one index lookup in the publisher_shop view
+    """
+    use_view = session.get_bind().dialect.name == 'postgresql'
+    return session.execute(publisher_shops_query(user_input, use_view)).all()
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mode', choices=['orm', 'bulk', 'sync', 'parallel'], default=LOAD_MODE,
+                        help='orm - load fixtures through the session, bulk - COPY/batched INSERT, '
+                             'sync - keep the tables and insert/update the changed rows only, '
+                             'parallel - COPY prepared by several processes over several connections')
+    parser.add_argument('--batch-size', type=int, default=LOAD_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=LOAD_WORKERS, help='processes and connections (parallel mode)')
+    parser.add_argument('--fixture', default=TEST_DATA_FILE_PATH, help='JSON array or JSON Lines file')
+    parser.add_argument('--partitions-since', type=datetime.date.fromisoformat,
+                        help='YYYY-MM-DD, first month of the sale partitions '
+                             '(the earliest sale of the fixture by default)')
+    parser.add_argument('--top', type=int, default=0, help='print top N publishers, shops and books by revenue')
+    parser.add_argument('--metrics', choices=['text', 'prometheus'], help='print statement timings on exit')
+    parser.add_argument('--slow-ms', type=float, help='log statements running longer (with --metrics)')
+    args = parser.parse_args()
+
     DSN = f'{DB_TYPE.lower()}://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
     engine = sqlalchemy.create_engine(DSN)
-    model.create_tables(engine)
+    if args.metrics:
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        import sqlmetrics
+        from sqlmetrics.engine import instrument_engine
+        sqlmetrics.REGISTRY.slow_threshold = args.slow_ms / 1000 if args.slow_ms is not None else None
+        instrument_engine(engine)
+    model.create_tables(engine, drop=args.mode != 'sync')
+
+    partitioned = model.SALE_PARTITIONED and engine.dialect.name == 'postgresql'
+    if partitioned:
+        # the sales are loaded straight into the monthly partitions instead of the default one
+        since = args.partitions_since or partitions.fixture_since(loader.iter_fixture(args.fixture))
+        print(f'Создано секций sale: {len(partitions.ensure_partitions(engine, since=since))}')
 
     Session = sessionmaker(bind=engine)
     session = Session()
-    fill_in_tables(session)
+    if args.mode == 'bulk':
+        loader.bulk_load(engine, loader.iter_fixture(args.fixture), args.batch_size)
+    elif args.mode == 'sync':
+        loader.sync_load(engine, loader.iter_fixture(args.fixture), args.batch_size)
+    elif args.mode == 'parallel':
+        parallel.parallel_load(engine, args.fixture, args.workers)
+    else:
+        fill_in_tables(session, args.fixture, args.batch_size)
+    if partitioned:
+        # the sales outside of the created partitions are moved out of the default partition
+        print(f'Создано секций sale после загрузки: {len(partitions.ensure_partitions(engine))}')
+    model.refresh_publisher_shop(engine)
+    rollups = engine.dialect.name in analytics.ROLLUP_DIALECTS
+    if rollups:
+        analytics.update_rollups(session)
+    elif args.top:
+        print('Отчёты по продажам доступны только для PostgreSQL и SQLite')
+    reports = [('Издатели', analytics.top_publishers), ('Магазины', analytics.top_shops), ('Книги', analytics.top_books)]
+    for title, report in reports if args.top and rollups else []:
+        print(f'{title} (шт., выручка):')
+        for name, units, revenue in report(session, limit=args.top):
+            print(f'  {name}: {units}, {revenue:.2f}')
     user_input = input('Введите ID или наименование издателя: ')
-    publisher_shops = (
-        session.query(Publisher.name, Shop.name)
-        .join(Stock, Stock.id_shop == Shop.id)
-        .join(Book, Book.id == Stock.id_book)
-        .join(Publisher, Book.id_publisher == Publisher.id)
-        .filter(Publisher.id == int(user_input) if user_input.isdigit() else Publisher.name == user_input)
-        .distinct(Shop.name)
-        .group_by(Publisher.name, Shop.name)
-    ).all()
-    if not len(publisher_shops):
+    shop_list = publisher_shops(session, user_input)
+    if not len(shop_list):
         print('Издатель не найден')
     else:
-        publisher = publisher_shops[0][0]
-        shops = [item[1] for item in publisher_shops]
+        publisher = shop_list[0][0]
+        shops = [item[1] for item in shop_list]
         print(f'Издатель: {publisher}')
         print(f'Его книги продаются в магазинах: {", ".join(shops)}')
+    if args.metrics:
+        print(sqlmetrics.REGISTRY.dump() if args.metrics == 'text' else sqlmetrics.REGISTRY.prometheus())
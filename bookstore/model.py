@@ -1,6 +1,10 @@
+import os
 import sqlalchemy
 from sqlalchemy.orm import declarative_base, relationship
 
+# sale is range partitioned by month of date_sale (PostgreSQL only), see partitions.py
+SALE_PARTITIONED = bool(int(os.getenv('SALE_PARTITIONED') or 0))
+
 Base = declarative_base()
 
 
@@ -32,7 +36,8 @@ class Book(Base):
 
     id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
     title = sqlalchemy.Column(sqlalchemy.Text, nullable=False)
-    id_publisher = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey("publisher.id"), nullable=False)
+    id_publisher = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey("publisher.id"), nullable=False,
+                                     index=True)
 
     stock = relationship('Stock', back_populates='book')
 
@@ -42,10 +47,11 @@ class Book(Base):
 
 class Stock(Base):
     __tablename__ = 'stock'
+    __table_args__ = (sqlalchemy.UniqueConstraint('id_book', 'id_shop'),)
 
     id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
-    id_book = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey("book.id"), nullable=False)
-    id_shop = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey("shop.id"), nullable=False)
+    id_book = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey("book.id"), nullable=False, index=True)
+    id_shop = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey("shop.id"), nullable=False, index=True)
     count = sqlalchemy.Column(sqlalchemy.Integer, nullable=False)
 
     sales = relationship('Sale', backref='stock')
@@ -58,10 +64,12 @@ class Stock(Base):
 
 class Sale(Base):
     __tablename__ = 'sale'
+    # the primary key of a partitioned table has to include the partition key
+    __table_args__ = {'postgresql_partition_by': 'RANGE (date_sale)'} if SALE_PARTITIONED else {}
 
-    id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+    id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True, autoincrement=True)
     price = sqlalchemy.Column(sqlalchemy.Float, nullable=False)
-    date_sale = sqlalchemy.Column(sqlalchemy.DateTime)
+    date_sale = sqlalchemy.Column(sqlalchemy.DateTime, primary_key=SALE_PARTITIONED, nullable=not SALE_PARTITIONED)
     id_stock = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey("stock.id"), nullable=False)
     count = sqlalchemy.Column(sqlalchemy.Integer, nullable=False)
 
@@ -69,6 +77,61 @@ class Sale(Base):
         return f'${self.price} ({self.count} pcs.) till {self.date_sale}'
 
 
-def create_tables(engine):
-    Base.metadata.drop_all(engine)
+if SALE_PARTITIONED:
+    # rows without a monthly partition go to the default one until partitions.ensure_partitions moves them,
+    # the index lets it move the rows of one month without scanning the whole default partition
+    sqlalchemy.event.listen(Sale.__table__, 'after_create', sqlalchemy.DDL(
+        'CREATE TABLE sale_default PARTITION OF sale DEFAULT'
+    ).execute_if(dialect='postgresql'))
+    sqlalchemy.event.listen(Sale.__table__, 'after_create', sqlalchemy.DDL(
+        'CREATE INDEX sale_default_date_sale_idx ON sale_default (date_sale)'
+    ).execute_if(dialect='postgresql'))
+
+
+# publishers and the shops selling their books, a materialized view outside of Base.metadata
+# so that it is not created as a table; it is created and dropped together with the tables (PostgreSQL only)
+publisher_shop = sqlalchemy.Table(
+    'publisher_shop', sqlalchemy.MetaData(),
+    sqlalchemy.Column('id_publisher', sqlalchemy.Integer),
+    sqlalchemy.Column('publisher_name', sqlalchemy.Text),
+    sqlalchemy.Column('id_shop', sqlalchemy.Integer),
+    sqlalchemy.Column('shop_name', sqlalchemy.Text),
+)
+
+sqlalchemy.event.listen(Base.metadata, 'after_create', sqlalchemy.DDL("""
+    CREATE MATERIALIZED VIEW IF NOT EXISTS publisher_shop AS
+    SELECT DISTINCT book.id_publisher, publisher.name AS publisher_name, stock.id_shop, shop.name AS shop_name
+    FROM stock
+    JOIN book ON book.id = stock.id_book
+    JOIN publisher ON publisher.id = book.id_publisher
+    JOIN shop ON shop.id = stock.id_shop;
+    CREATE UNIQUE INDEX IF NOT EXISTS publisher_shop_id_publisher_id_shop_idx ON publisher_shop (id_publisher, id_shop);
+    CREATE INDEX IF NOT EXISTS publisher_shop_publisher_name_idx ON publisher_shop (publisher_name);
+""").execute_if(dialect='postgresql'))
+sqlalchemy.event.listen(Base.metadata, 'before_drop', sqlalchemy.DDL(
+    'DROP MATERIALIZED VIEW IF EXISTS publisher_shop'
+).execute_if(dialect='postgresql'))
+
+
+def create_tables(engine, drop=True):
+    """
+    :param engine: SQLAlchemy engine
+    :param drop: drop the existing tables first, otherwise only the missing tables are created
+    """
+    if drop:
+        Base.metadata.drop_all(engine)
     Base.metadata.create_all(engine)
+
+
+def refresh_publisher_shop(engine, concurrently=True):
+    """
+    :param engine: SQLAlchemy engine
+    :param concurrently: refresh without blocking the readers of the view
+    :return: updates the publisher_shop view after the stock, book, publisher or shop tables were changed
+    """
+    if engine.dialect.name != 'postgresql':
+        return
+    with engine.begin() as connection:
+        connection.execute(sqlalchemy.text(
+            f'REFRESH MATERIALIZED VIEW {"CONCURRENTLY " if concurrently else ""}publisher_shop'
+        ))
@@ -0,0 +1,145 @@
+import concurrent.futures
+import json
+import os
+import tempfile
+import time
+import psycopg2
+import sqlalchemy
+import loader
+import model
+
+CHUNKS_PER_WORKER = 4
+MIN_CHUNK_SIZE = 1024 * 1024
+
+
+def split_file(path: str, chunks: int):
+    """
+    :param path: path to a JSON Lines file
+    :param chunks: desired number of chunks
+    :return: list of (start, end) byte ranges starting at line boundaries and covering the file
+    """
+    size = os.path.getsize(path)
+    chunk_size = max(size // max(chunks, 1), MIN_CHUNK_SIZE)
+    ranges, start = [], 0
+    with open(path, 'rb') as file:
+        while start < size:
+            file.seek(min(start + chunk_size, size))
+            file.readline()
+            end = min(file.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def fk_levels(tables):
+    """
+    :param tables: tables in the foreign key dependency order (metadata.sorted_tables)
+    :return: list of lists of tables, the tables of a level reference only the tables of the previous levels
+    """
+    level = {}
+    for table in tables:
+        level[table] = max([level[fk.column.table] + 1 for fk in table.foreign_keys if fk.column.table in level] or [0])
+    return [[table for table in tables if level[table] == i] for i in range(max(level.values(), default=-1) + 1)]
+
+
+def build_chunk(path: str, start: int, end: int, directory: str):
+    """
+    :param path: path to a JSON Lines fixture
+    :param start: first byte of the chunk
+    :param end: byte after the chunk
+    :param directory: directory for the COPY files
+    :return: decodes and validates the items of the chunk and writes a COPY text file per table,
+    returns {table_name: (file path, row count)}
+    """
+    files = {}
+    try:
+        with open(path, 'rb') as file:
+            file.seek(start)
+            data = file.read(end - start).decode('utf-8')
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            table_name, row = loader.fixture_row(json.loads(line))
+            if 'id' not in row:
+                raise ValueError(f'Item of model {table_name} has no pk, parallel mode loads explicit ids')
+            if table_name not in files:
+                table = model.Base.metadata.tables[table_name]
+                output = tempfile.NamedTemporaryFile('w', dir=directory, suffix=f'.{table_name}', delete=False,
+                                                     encoding='utf-8')
+                files[table_name] = [output, table.columns.keys(), 0]
+            output, columns, _ = files[table_name]
+            output.write('\t'.join(loader.copy_text(row.get(column)) for column in columns) + '\n')
+            files[table_name][2] += 1
+    finally:
+        for output, _, _ in files.values():
+            output.close()
+    return {table_name: (output.name, count) for table_name, (output, _, count) in files.items()}
+
+
+def copy_file(dsn: str, table: sqlalchemy.Table, path: str):
+    """
+    :param dsn: PostgreSQL connection string
+    :param table: target table
+    :param path: COPY text file with all the table columns
+    :return: loads the file over its own connection and transaction
+    """
+    connection = psycopg2.connect(dsn)
+    try:
+        with connection, connection.cursor() as cur, open(path, encoding='utf-8') as file:
+            cur.copy_expert(f'COPY {table.name} ({", ".join(table.columns.keys())}) FROM STDIN', file)
+    finally:
+        connection.close()
+        os.remove(path)
+
+
+def parallel_load(engine: sqlalchemy.engine.Engine, path: str, workers: int = None):
+    """
+    :param engine: SQLAlchemy engine (PostgreSQL)
+    :param path: path to the fixture, JSON Lines are split by lines, a JSON array is converted to JSON Lines first
+    :param workers: number of processes decoding the fixture and of connections writing it (CPU count by default)
+    :return: loads the fixture: chunks are decoded and converted to COPY files in a process pool,
+    then the files are written table level by level in the foreign key order over separate connections
+    (a transaction per file, so a failed load leaves the loaded files in the tables); returns {table_name: row_count}
+    """
+    if engine.dialect.name != 'postgresql':
+        raise Exception('Parallel mode requires PostgreSQL')
+    workers = workers or os.cpu_count() or 1
+    dsn = engine.url.set(drivername='postgresql').render_as_string(hide_password=False)
+    result = {}
+    with tempfile.TemporaryDirectory() as directory:
+        with open(path) as file:
+            is_array = file.read(1024).lstrip().startswith('[')
+        if is_array:
+            lines_path = os.path.join(directory, 'fixture.jsonl')
+            with open(lines_path, 'w', encoding='utf-8') as file:
+                for item in loader.iter_fixture(path):
+                    file.write(json.dumps(item) + '\n')
+            path = lines_path
+
+        started = time.perf_counter()
+        files = {}
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            chunks = [pool.submit(build_chunk, path, start, end, directory)
+                      for start, end in split_file(path, workers * CHUNKS_PER_WORKER)]
+            for chunk in chunks:
+                for table_name, (file_path, count) in chunk.result().items():
+                    files.setdefault(table_name, []).append((file_path, count))
+        print(f'разбор фикстуры: {sum(count for items in files.values() for _, count in items)} строк '
+              f'за {time.perf_counter() - started:.2f} с ({workers} процессов)')
+
+        with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+            for level in fk_levels(model.Base.metadata.sorted_tables):
+                tables = [table for table in level if table.name in files]
+                started = time.perf_counter()
+                for future in [pool.submit(copy_file, dsn, table, file_path)
+                               for table in tables for file_path, _ in files[table.name]]:
+                    future.result()
+                with engine.begin() as connection:
+                    for table in tables:
+                        loader.reset_sequence(connection, table)
+                elapsed = time.perf_counter() - started
+                for table in tables:
+                    result[table.name] = sum(count for _, count in files[table.name])
+                    print(f'{table.name}: загружено {result[table.name]} строк за {elapsed:.2f} с '
+                          f'({result[table.name] / (elapsed or 1e-9):.0f} строк/с)')
+    return result
@@ -0,0 +1,173 @@
+import argparse
+import datetime
+import os
+import re
+import sqlalchemy
+import model
+
+TABLE = 'sale'
+DEFAULT_PARTITION = 'sale_default'
+MONTHS_AHEAD = int(os.getenv('SALE_PARTITIONS_AHEAD') or 3)
+RETENTION_MONTHS = int(os.getenv('SALE_RETENTION_MONTHS') or 0)
+BOUND = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+LOCK = sqlalchemy.text("SELECT pg_advisory_xact_lock(hashtext('sale_partitions'))")
+
+
+def month_start(value):
+    """
+    :param value: date or datetime
+    :return: first day of the month
+    """
+    return datetime.date(value.year, value.month, 1)
+
+
+def add_months(month: datetime.date, months: int):
+    """
+    :param month: first day of a month
+    :param months: number of months (negative - back)
+    :return: first day of the month shifted by months
+    """
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime.date):
+    return f'{TABLE}_y{month.year}m{month.month:02d}'
+
+
+def check_partitioned(engine: sqlalchemy.engine.Engine):
+    if engine.dialect.name != 'postgresql' or not model.SALE_PARTITIONED:
+        raise Exception('Sale partitioning requires PostgreSQL and SALE_PARTITIONED=1')
+
+
+def partitions(connection):
+    """
+    :param connection: SQLAlchemy connection
+    :return: list of (name, first day, first day after) of the monthly partitions ordered by date,
+    the default partition is not included
+    """
+    rows = connection.execute(sqlalchemy.text('''
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:table AS regclass)
+    '''), {'table': TABLE}).all()
+    result = []
+    for name, bound in rows:
+        match = BOUND.search(bound)
+        if match:
+            result.append((name, datetime.date.fromisoformat(match[1][:10]), datetime.date.fromisoformat(match[2][:10])))
+    return sorted(result, key=lambda item: item[1])
+
+
+def create_partition(connection, month: datetime.date):
+    """
+    :param connection: SQLAlchemy connection (in a transaction)
+    :param month: first day of the month
+    :return: creates the partition of the month and moves its rows from the default partition;
+    the partition is filled and checked before it is attached, so attaching does not scan it again,
+    but attaching scans the default partition, so the partitions should be created before loading the sales
+    """
+    name, start, end = partition_name(month), month, add_months(month, 1)
+    connection.execute(sqlalchemy.text(f'CREATE TABLE {name} (LIKE {TABLE})'))
+    connection.execute(sqlalchemy.text(f'''
+        WITH moved AS (
+            DELETE FROM {DEFAULT_PARTITION} WHERE date_sale >= :start AND date_sale < :end RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    '''), {'start': start, 'end': end})
+    connection.execute(sqlalchemy.text(
+        f"ALTER TABLE {name} ADD CONSTRAINT {name}_bound "
+        f"CHECK (date_sale >= '{start}' AND date_sale < '{end}')"
+    ))
+    connection.execute(sqlalchemy.text(
+        f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')"
+    ))
+    connection.execute(sqlalchemy.text(f'ALTER TABLE {name} DROP CONSTRAINT {name}_bound'))
+    return name
+
+
+def fixture_since(items):
+    """
+    :param items: fixture items (loader.iter_fixture)
+    :return: day of the earliest sale of the fixture, None if there are no sales
+    """
+    days = (item['fields'].get('date_sale') for item in items if item['model'] == 'sale')
+    first = min((day[:10] for day in days if day), default=None)
+    return datetime.date.fromisoformat(first) if first else None
+
+
+def ensure_partitions(engine: sqlalchemy.engine.Engine, months_ahead: int = MONTHS_AHEAD,
+                      since: datetime.date = None, today: datetime.date = None):
+    """
+    :param engine: SQLAlchemy engine (PostgreSQL, SALE_PARTITIONED=1)
+    :param months_ahead: number of months after the current one to create in advance
+    :param since: also create the partitions from this month (e.g. before loading old sales)
+    :param today: current date (today by default)
+    :return: creates the missing monthly partitions for the rows in the default partition, for the months from since
+    and for the current and upcoming months, returns the names of the created partitions
+    """
+    check_partitioned(engine)
+    current = month_start(today or datetime.date.today())
+    months = {add_months(current, i) for i in range(months_ahead + 1)}
+    if since:
+        month = month_start(since)
+        while month < current:
+            months.add(month)
+            month = add_months(month, 1)
+    with engine.begin() as connection:
+        connection.execute(LOCK)
+        months.update(month_start(month) for month, in connection.execute(sqlalchemy.text(
+            f"SELECT DISTINCT CAST(date_trunc('month', date_sale) AS date) FROM {DEFAULT_PARTITION}"
+        )))
+        existing = {start for _, start, _ in partitions(connection)}
+        return [create_partition(connection, month) for month in sorted(months - existing)]
+
+
+def drop_old_partitions(engine: sqlalchemy.engine.Engine, retention_months: int, detach_only: bool = False,
+                        today: datetime.date = None):
+    """
+    :param engine: SQLAlchemy engine (PostgreSQL, SALE_PARTITIONED=1)
+    :param retention_months: number of months before the current one to keep
+    :param detach_only: keep the detached partitions as separate tables without foreign keys (e.g. to archive them)
+    :param today: current date (today by default)
+    :return: detaches and drops the partitions ending before the retention horizon without deleting rows one by one,
+    returns their names; old rows in the default partition are kept until ensure_partitions moves them out,
+    the daily rollups of analytics.py keep the removed sales if they were updated before
+    """
+    check_partitioned(engine)
+    horizon = add_months(month_start(today or datetime.date.today()), -retention_months)
+    with engine.begin() as connection:
+        connection.execute(LOCK)
+        old = [name for name, _, end in partitions(connection) if end <= horizon]
+        for name in old:
+            connection.execute(sqlalchemy.text(f'ALTER TABLE {TABLE} DETACH PARTITION {name}'))
+            if not detach_only:
+                connection.execute(sqlalchemy.text(f'DROP TABLE {name}'))
+                continue
+            # an archived partition should not keep the stock rows from being deleted
+            for constraint, in connection.execute(sqlalchemy.text(
+                "SELECT conname FROM pg_constraint WHERE conrelid = CAST(:name AS regclass) AND contype = 'f'"
+            ), {'name': name}).all():
+                connection.execute(sqlalchemy.text(f'ALTER TABLE {name} DROP CONSTRAINT {constraint}'))
+    return old
+
+
+if __name__ == '__main__':
+    from main import DB_TYPE, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME
+
+    parser = argparse.ArgumentParser(description='Creates upcoming sale partitions and removes the expired ones')
+    parser.add_argument('--months-ahead', type=int, default=MONTHS_AHEAD)
+    parser.add_argument('--retention-months', type=int, default=RETENTION_MONTHS, help='0 - keep all partitions')
+    parser.add_argument('--detach-only', action='store_true', help='detach the expired partitions without dropping')
+    args = parser.parse_args()
+
+    DSN = f'{DB_TYPE.lower()}://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+    engine = sqlalchemy.create_engine(DSN)
+    created = ensure_partitions(engine, args.months_ahead)
+    print(f'Создано секций: {len(created)} {", ".join(created)}')
+    if args.retention_months:
+        removed = drop_old_partitions(engine, args.retention_months, args.detach_only)
+        print(f'{"Отсоединено" if args.detach_only else "Удалено"} секций: {len(removed)} {", ".join(removed)}')
+    with engine.connect() as connection:
+        items = partitions(connection)
+    print(f'Секций: {len(items)}' + (f', с {items[0][1]} по {items[-1][2]}' if items else ''))
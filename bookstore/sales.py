@@ -0,0 +1,109 @@
+import datetime
+import sqlalchemy
+from model import Sale, Stock
+
+RECORD_SALE = sqlalchemy.text('''
+    WITH updated AS (
+        UPDATE stock SET count = count - :count WHERE id = :id_stock AND count >= :count RETURNING id
+    )
+    INSERT INTO sale (price, date_sale, id_stock, count)
+    SELECT :price, :date_sale, id, :count FROM updated
+    RETURNING id
+''')
+LOCK_STOCK = sqlalchemy.text('SELECT id FROM stock WHERE id = ANY(:ids) ORDER BY id FOR UPDATE')
+RECORD_SALES = sqlalchemy.text('''
+    WITH requested AS (
+        SELECT * FROM unnest(CAST(:id_stock AS integer[]), CAST(:count AS integer[]),
+                             CAST(:price AS double precision[]), CAST(:date_sale AS timestamp[]))
+        WITH ORDINALITY AS r(id_stock, count, price, date_sale, n)
+    ), accepted AS (
+        SELECT nextval(pg_get_serial_sequence('sale', 'id')) AS id, r.*
+        FROM (
+            SELECT *, sum(count) OVER (PARTITION BY id_stock ORDER BY n) AS total FROM requested
+        ) r
+        JOIN stock ON stock.id = r.id_stock
+        WHERE r.total <= stock.count
+    ), updated AS (
+        UPDATE stock SET count = stock.count - t.count
+        FROM (SELECT id_stock, sum(count) AS count FROM accepted GROUP BY id_stock) t
+        WHERE stock.id = t.id_stock
+    ), inserted AS (
+        INSERT INTO sale (id, price, date_sale, id_stock, count)
+        SELECT id, price, date_sale, id_stock, count FROM accepted
+    )
+    SELECT n, id FROM accepted
+''')
+
+
+class OutOfStock(Exception):
+    pass
+
+
+def record_sale(session: sqlalchemy.orm.session.Session, id_stock: int, count: int, price: float,
+                date_sale: datetime.datetime = None):
+    """
+    :param session: SQLAlchemy session
+    :param id_stock: stock ID
+    :param count: number of sold books
+    :param price: price
+    :param date_sale: date of the sale (now by default)
+    :return: decrements the stock if it has enough books and adds the sale in one statement (on PostgreSQL),
+    commits and returns the sale ID, raises OutOfStock if the stock has less than count books
+    """
+    params = {'id_stock': id_stock, 'count': count, 'price': price, 'date_sale': date_sale or datetime.datetime.now()}
+    if session.get_bind().dialect.name == 'postgresql':
+        sale_id = session.execute(RECORD_SALE, params).scalar()
+    else:
+        sale_id = _record_sale(session, params)
+    session.commit()
+    if sale_id is None:
+        raise OutOfStock(f'Stock {id_stock} has less than {count} books')
+    return sale_id
+
+
+def record_sales(session: sqlalchemy.orm.session.Session, sales: list):
+    """
+    :param session: SQLAlchemy session
+    :param sales: list of dicts like {'id_stock': ..., 'count': ..., 'price': ..., 'date_sale': ...}
+    :return: records the sales in one transaction and commits, returns a list of sale IDs in the input order,
+    None for the sales rejected because the stock ran out (sales of the same stock are accepted in the input order
+    until the first one exceeding the rest of the stock); the stock rows are locked in ID order so concurrent batches
+    do not deadlock
+    """
+    if not sales:
+        return []
+    params = {
+        'id_stock': [sale['id_stock'] for sale in sales],
+        'count': [sale['count'] for sale in sales],
+        'price': [sale['price'] for sale in sales],
+        'date_sale': [sale.get('date_sale') or datetime.datetime.now() for sale in sales],
+    }
+    result = [None] * len(sales)
+    if session.get_bind().dialect.name == 'postgresql':
+        session.execute(LOCK_STOCK, {'ids': sorted(set(params['id_stock']))}).all()
+        for n, sale_id in session.execute(RECORD_SALES, params):
+            result[n - 1] = sale_id
+    else:
+        out_of_stock = set()
+        for i, values in enumerate(zip(*params.values())):
+            sale = dict(zip(params, values))
+            if sale['id_stock'] not in out_of_stock:
+                result[i] = _record_sale(session, sale)
+                if result[i] is None:
+                    out_of_stock.add(sale['id_stock'])
+    session.commit()
+    return result
+
+
+def _record_sale(session: sqlalchemy.orm.session.Session, params: dict):
+    """
+    conditional UPDATE and INSERT for the databases without data-modifying CTEs, the caller commits
+    """
+    updated = session.execute(
+        sqlalchemy.update(Stock)
+        .where(Stock.id == params['id_stock'], Stock.count >= params['count'])
+        .values(count=Stock.count - params['count'])
+    )
+    if not updated.rowcount:
+        return None
+    return session.execute(sqlalchemy.insert(Sale).values(**params)).inserted_primary_key[0]
@@ -0,0 +1,70 @@
+import datetime
+import pytest
+import sqlalchemy
+from sqlalchemy.orm import Session
+import analytics
+import model
+
+DAY = datetime.date(2022, 10, 1)
+
+
+@pytest.fixture
+def session():
+    engine = sqlalchemy.create_engine('sqlite://')
+    model.Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all([
+            model.Publisher(id=1, name='Publisher'), model.Shop(id=1, name='Shop'),
+            model.Book(id=1, title='Book', id_publisher=1), model.Stock(id=1, id_book=1, id_shop=1, count=100),
+        ])
+        session.commit()
+        yield session
+
+
+def add_sale(session: Session, sale_id: int, count: int, day: datetime.date = DAY):
+    session.add(model.Sale(id=sale_id, price=10, date_sale=datetime.datetime.combine(day, datetime.time(12)),
+                           id_stock=1, count=count))
+    session.commit()
+
+
+def shop_units(session: Session):
+    """
+    :return: {day: units} of the shop rollup
+    """
+    rows = session.execute(sqlalchemy.select(analytics.SaleDailyShop.day, analytics.SaleDailyShop.units)).all()
+    return dict(rows)
+
+
+def test_late_sale_in_gap_is_counted_once(session):
+    add_sale(session, 1, 1)
+    add_sale(session, 3, 2)
+    assert analytics.update_rollups(session) == 2
+    assert session.execute(sqlalchemy.select(analytics.RollupGap.first_id, analytics.RollupGap.last_id)).all() \
+        == [(2, 2)]
+
+    add_sale(session, 2, 4)
+    assert analytics.update_rollups(session) == 1
+    assert analytics.update_rollups(session) == 0
+    assert shop_units(session) == {DAY: 7}
+    assert not session.execute(sqlalchemy.select(analytics.RollupGap)).all()
+
+
+def test_refresh_days_with_gap(session):
+    add_sale(session, 1, 1)
+    add_sale(session, 3, 2)
+    analytics.update_rollups(session)
+
+    sale = session.get(model.Sale, 1)
+    sale.count = 5
+    moved = session.get(model.Sale, 3)
+    moved.date_sale += datetime.timedelta(days=1)
+    session.commit()
+    assert analytics.refresh_days(session, {DAY, DAY + datetime.timedelta(days=1)}) == 2
+    assert shop_units(session) == {DAY: 5, DAY + datetime.timedelta(days=1): 2}
+
+    # the sale committed in the gap is added by update_rollups, not by refresh_days
+    add_sale(session, 2, 4)
+    analytics.refresh_days(session, {DAY})
+    assert shop_units(session)[DAY] == 5
+    analytics.update_rollups(session)
+    assert shop_units(session) == {DAY: 9, DAY + datetime.timedelta(days=1): 2}
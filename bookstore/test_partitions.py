@@ -0,0 +1,31 @@
+import datetime
+import os
+import pytest
+import sqlalchemy
+from bench_partitions import QUERIES, query_bounds, measure
+import model
+import partitions
+
+# the tables of this database are recreated by the tests, SALE_PARTITIONED=1 is required
+TEST_DSN = os.getenv('BOOKSTORE_TEST_DSN')
+# 31 days, so every query of QUERIES stays inside the month
+MONTH = datetime.date(2018, 5, 1)
+
+
+@pytest.fixture(scope='module')
+def engine():
+    if not TEST_DSN or not model.SALE_PARTITIONED:
+        pytest.skip('BOOKSTORE_TEST_DSN and SALE_PARTITIONED=1 are required')
+    engine = sqlalchemy.create_engine(TEST_DSN)
+    model.create_tables(engine)
+    partitions.ensure_partitions(engine, months_ahead=1, since=partitions.add_months(MONTH, -1), today=MONTH)
+    yield engine
+    engine.dispose()
+
+
+@pytest.mark.parametrize('name', list(QUERIES))
+def test_query_reads_only_its_partition(engine, name):
+    query, days = QUERIES[name]
+    with engine.connect() as connection:
+        relations, _ = measure(connection, query, query_bounds(MONTH, days), 1)
+    assert relations == {partitions.partition_name(MONTH)}
@@ -0,0 +1,2 @@
+from .stream import FORMATS, COPY_OPTIONS, open_output, guess_format, snapshot, copy_query
+from .incremental import GAP_TIMEOUT, RANGES, id_ranges, missing_ids, read_state, write_state
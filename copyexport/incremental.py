@@ -0,0 +1,82 @@
+import json
+import os
+import time
+import psycopg2.extensions
+
+# IDs are taken from the sequence before the transaction commits, a missing ID is rechecked for this long (seconds)
+GAP_TIMEOUT = 60 * 60
+# joins the ranges of the exported IDs, the query of an incremental export should include it for the exported table
+RANGES = (
+    'JOIN unnest(%(range_first)s::int[], %(range_last)s::int[]) AS r(first_id, last_id) '
+    'ON {id} BETWEEN r.first_id AND r.last_id'
+)
+MISSING_QUERY = '''
+    WITH r AS (
+        SELECT * FROM unnest(%(range_first)s::int[], %(range_last)s::int[], %(range_created)s::float8[])
+            AS r(first_id, last_id, created)
+    ), ids AS (
+        SELECT r.first_id, r.created, t.id FROM r JOIN {table} t ON t.id BETWEEN r.first_id AND r.last_id
+        UNION ALL
+        SELECT first_id, created, last_id + 1 FROM r
+    )
+    SELECT previous + 1, id - 1, created FROM (
+        SELECT id, created, lag(id, 1, first_id - 1) OVER (PARTITION BY first_id ORDER BY id) AS previous FROM ids
+    ) s
+    WHERE id > previous + 1
+    ORDER BY 1
+'''
+
+
+def id_ranges(cursor: psycopg2.extensions.cursor, table: str, since_id: int = 0, gaps: list = None,
+              timeout: float = GAP_TIMEOUT):
+    """
+    :param cursor: psycopg2 cursor (in the snapshot of the export)
+    :param table: table with an id column
+    :param since_id: last_id of the previous export
+    :param gaps: gaps of the previous export, list of [first ID, last ID, time the gap was found]
+    :param timeout: seconds after which a gap is considered to be left by a rolled back transaction
+    :return: (last_id, parameters of RANGES and MISSING_QUERY), the ranges are the IDs after since_id
+    and the gaps found less than timeout ago
+    """
+    cursor.execute(f'SELECT max(id) FROM {table}')
+    last_id = max(cursor.fetchone()[0] or 0, since_id)
+    now = time.time()
+    ranges = [gap for gap in gaps or [] if gap[2] >= now - timeout] + [[since_id + 1, last_id, now]]
+    return last_id, {
+        'range_first': [item[0] for item in ranges],
+        'range_last': [item[1] for item in ranges],
+        'range_created': [item[2] for item in ranges],
+    }
+
+
+def missing_ids(cursor: psycopg2.extensions.cursor, table: str, params: dict):
+    """
+    :param cursor: psycopg2 cursor (in the snapshot of the export)
+    :param table: table with an id column
+    :param params: parameters returned by id_ranges
+    :return: gaps of the exported ranges, list of [first ID, last ID, time the gap was found],
+    the IDs of a gap may still be committed by the transactions in progress
+    """
+    cursor.execute(MISSING_QUERY.format(table=table), params)
+    return [list(row) for row in cursor.fetchall()]
+
+
+def read_state(path: str):
+    """
+    :param path: JSON file with the state of the previous export
+    :return: {'last_id': ..., 'gaps': [...]}, an empty state if the file does not exist
+    """
+    if not os.path.exists(path):
+        return {'last_id': 0, 'gaps': []}
+    with open(path) as file:
+        return json.load(file)
+
+
+def write_state(path: str, result: dict):
+    """
+    :param path: JSON file with the state of the export
+    :param result: result of the export with last_id and gaps
+    :return: writes the state for the next export
+    """
+    with open(path, 'w') as file:
+        json.dump({'last_id': result['last_id'], 'gaps': result['gaps']}, file)
@@ -0,0 +1,62 @@
+import contextlib
+import gzip
+import sys
+import psycopg2.extensions
+
+FORMATS = ['csv', 'jsonl']
+# rows of one json column written as CSV with quote and delimiter characters that never occur in JSON text,
+# so the server neither quotes nor escapes the documents
+COPY_OPTIONS = {
+    'csv': "(FORMAT csv, HEADER true)",
+    'jsonl': "(FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02')",
+}
+
+
+@contextlib.contextmanager
+def open_output(path: str):
+    """
+    :param path: output file, gzip compressed if it ends with .gz, - for stdout
+    :return: context manager with a binary file
+    """
+    if path == '-':
+        yield sys.stdout.buffer
+        sys.stdout.buffer.flush()
+        return
+    with (gzip.open(path, 'wb') if path.endswith('.gz') else open(path, 'wb')) as file:
+        yield file
+
+
+def guess_format(path: str):
+    """
+    :param path: output file
+    :return: jsonl for .jsonl and .jsonl.gz files, csv otherwise
+    """
+    return 'jsonl' if path.endswith('.jsonl') or path.endswith('.jsonl.gz') else 'csv'
+
+
+def snapshot(cursor: psycopg2.extensions.cursor):
+    """
+    :param cursor: psycopg2 cursor
+    :return: starts a read-only REPEATABLE READ transaction, so all the statements of the export see the same data
+    (does nothing if a transaction is already in progress)
+    """
+    if cursor.connection.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+
+
+def copy_query(cursor: psycopg2.extensions.cursor, query: str, params: dict, output, format: str = 'csv'):
+    """
+    :param cursor: psycopg2 cursor
+    :param query: SELECT statement
+    :param params: statement parameters
+    :param output: binary file
+    :param format: csv (with a header) or jsonl (an object per row)
+    :return: streams the rows with COPY (...) TO STDOUT into the file, returns the number of rows
+    """
+    if format not in FORMATS:
+        raise Exception(f'Unknown format {format}')
+    query = cursor.mogrify(query, params).decode()
+    if format == 'jsonl':
+        query = f'SELECT row_to_json(t) FROM ({query}) t'
+    cursor.copy_expert(f'COPY ({query}) TO STDOUT WITH {COPY_OPTIONS[format]}', output)
+    return cursor.rowcount
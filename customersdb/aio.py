@@ -0,0 +1,285 @@
+import asyncpg
+from main import Client, Clients, Phone, DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_POOL_MIN_SIZE, \
+    DB_POOL_MAX_SIZE, STATEMENTS
+from statements import positional
+
+ASYNC_STATEMENTS = {name: positional(query)[0] for name, query in STATEMENTS.items()}
+ASYNC_STATEMENTS.update({
+    'insert_clients_many': 'INSERT INTO client (first_name, last_name, email) '
+                           'SELECT * FROM unnest($1::text[], $2::text[], $3::text[]) RETURNING id',
+    'insert_phones_many': 'INSERT INTO client_phone (client_id, phone) '
+                          'SELECT * FROM unnest($1::integer[], $2::text[]) RETURNING id',
+})
+
+
+class AsyncClients:
+    def __init__(self, pool: asyncpg.Pool):
+        """
+        :param pool: asyncpg connection pool, statements are prepared and cached by asyncpg per connection
+        """
+        self.pool = pool
+        self._own_pool = False
+
+    @classmethod
+    async def connect(cls, database=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT,
+                      min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE):
+        """
+        :param database: name of database
+        :param user: user name
+        :param password: password
+        :param host: IP-address or domain name
+        :param port: port
+        :param min_size: min number of connections in the pool
+        :param max_size: max number of connections in the pool
+        :return: AsyncClients instance with its own pool
+        """
+        pool = await asyncpg.create_pool(database=database, user=user, password=password or None, host=host,
+                                         port=port, min_size=min_size, max_size=max_size)
+        clients = cls(pool)
+        clients._own_pool = True
+        return clients
+
+    async def close(self):
+        """
+        :return: closes the pool if it was created by connect
+        """
+        if self._own_pool:
+            await self.pool.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def add(self, first_name=None, last_name=None, email=None):
+        """
+        :param first_name: client first name
+        :param last_name:client last name
+        :param email: client e-mail address
+        :return: Adds the client to the database, returns an AsyncClient instance
+        """
+        client_id = await self.pool.fetchval(ASYNC_STATEMENTS['insert_client'], first_name, last_name, email)
+        return AsyncClient(self, client_id, first_name, last_name, email)
+
+    async def add_many(self, clients: list):
+        """
+        :param clients: list of dicts like {'first_name': ..., 'last_name': ..., 'email': ..., 'phones': [...]}
+        :return: adds the clients and their phone numbers in one transaction (one statement per table),
+        returns a list of AsyncClient instances in the input order
+        """
+        numbers = [[Phone.parse(phone) for phone in item.get('phones', [])] for item in clients]
+        async with self.pool.acquire() as connection, connection.transaction():
+            rows = await connection.fetch(
+                ASYNC_STATEMENTS['insert_clients_many'],
+                [item.get('first_name') for item in clients],
+                [item.get('last_name') for item in clients],
+                [item.get('email') for item in clients],
+            )
+            result = [
+                AsyncClient(self, row[0], item.get('first_name'), item.get('last_name'), item.get('email'))
+                for row, item in zip(rows, clients)
+            ]
+            phone_rows = [
+                (client, number) for client, client_numbers in zip(result, numbers) for number in client_numbers
+            ]
+            phone_ids = await connection.fetch(
+                ASYNC_STATEMENTS['insert_phones_many'],
+                [client.id for client, _ in phone_rows], [number for _, number in phone_rows]
+            ) if phone_rows else []
+        client_phones = {client.id: [] for client in result}
+        for phone_id, (client, number) in zip(phone_ids, phone_rows):
+            client_phones[client.id].append(Phone.from_row(number, phone_id[0]))
+        for client in result:
+            client.cache_phones(client_phones[client.id])
+        return result
+
+    async def change(self, client_id: int, prop: str, *params):
+        """
+        :param client_id: client ID in the database
+        :param prop: same as in Clients.change
+        :param params: same as in Clients.change
+        :return: True if value changed
+        """
+        if prop == 'phone':
+            if len(params) < 2:
+                raise Exception('To change phone number you should specify old number and then new phone number!')
+            phone_id, new_number = params
+            new_number = Phone.parse(new_number) if not isinstance(new_number, Phone) else new_number.number
+            return await self.pool.fetchval(ASYNC_STATEMENTS['update_phone'], new_number, phone_id) == phone_id
+        if prop not in ['first_name', 'last_name', 'email']:
+            raise Exception(f'Unknown parameter {prop}')
+        return await self.pool.fetchval(ASYNC_STATEMENTS[f'update_{prop}'], params[0], client_id) == client_id
+
+    async def add_phone(self, client_id: int, phone: str):
+        """
+        :param client_id: client ID in the database
+        :param phone: phone number in international format
+        :return: adds a phone number for the specified client, returns an instance of Phone
+        """
+        phone_number = Phone.parse(phone)
+        if phone_id := await self.pool.fetchval(ASYNC_STATEMENTS['insert_phone'], client_id, phone_number):
+            return Phone(phone_number, phone_id)
+
+    async def add_phones_many(self, phones: list):
+        """
+        :param phones: list of (client_id, phone number) pairs
+        :return: adds the phone numbers with one statement, returns a list of Phone instances in the input order
+        """
+        rows = [(client_id, Phone.parse(phone)) for client_id, phone in phones]
+        if not rows:
+            return []
+        ids = await self.pool.fetch(ASYNC_STATEMENTS['insert_phones_many'],
+                                    [client_id for client_id, _ in rows], [number for _, number in rows])
+        return [Phone.from_row(number, phone_id[0]) for phone_id, (_, number) in zip(ids, rows)]
+
+    async def list_phone(self, client_id):
+        """
+        :param client_id: client ID in the database
+        :return: list of client phone numbers
+        """
+        rows = await self.pool.fetch(ASYNC_STATEMENTS['list_phones'], client_id)
+        return [Phone.from_row(item[1], item[0]) for item in rows]
+
+    async def list(self, prefetch_phones=False, limit=None, after_id=None):
+        """
+        :param prefetch_phones: same as in Clients.list
+        :param limit: same as in Clients.list
+        :param after_id: same as in Clients.list
+        :return: list of clients ordered by ID
+        """
+        return await self.find({}, prefetch_phones, limit, after_id)
+
+    async def find(self, filters: dict, prefetch_phones=False, limit=None, after_id=None, modes: dict = None):
+        """
+        :param filters: same as in Clients.find
+        :param prefetch_phones: same as in Clients.find
+        :param limit: same as in Clients.find
+        :param after_id: same as in Clients.find
+        :param modes: same as in Clients.find
+        :return: list of clients ordered by ID
+        """
+        query, params = Clients._select_query(filters, limit, after_id, modes)
+        async with self.pool.acquire() as connection:
+            rows = await connection.fetch(positional(query)[0], *params)
+            clients = [AsyncClient(self, *client) for client in rows]
+            if prefetch_phones and clients:
+                phones = {client.id: [] for client in clients}
+                for phone_id, client_id, number in await connection.fetch(
+                        ASYNC_STATEMENTS['list_phones_many'], list(phones)):
+                    phones[client_id].append(Phone.from_row(number, phone_id))
+                for client in clients:
+                    client.cache_phones(phones[client.id])
+            return clients
+
+    async def remove(self, client_id):
+        """
+        :param client_id: client ID in the database
+        :return: True if removed
+        """
+        async with self.pool.acquire() as connection, connection.transaction():
+            await connection.execute(ASYNC_STATEMENTS['delete_client_phones'], client_id)
+            return await connection.fetchval(ASYNC_STATEMENTS['delete_client'], client_id) == client_id
+
+    async def remove_many(self, client_ids: list):
+        """
+        :param client_ids: list of client IDs in the database
+        :return: removes the clients and all their phone numbers in one transaction, returns the number of removed clients
+        """
+        client_ids = list(client_ids)
+        if not client_ids:
+            return 0
+        async with self.pool.acquire() as connection, connection.transaction():
+            await connection.execute(ASYNC_STATEMENTS['delete_phones_many'], client_ids)
+            status = await connection.execute(ASYNC_STATEMENTS['delete_clients_many'], client_ids)
+            return int(status.split()[-1])
+
+    async def remove_phone(self, client_id, phone: Phone = None):
+        """
+        :param client_id: client ID in the database
+        :param phone: phone (if not passed, all the client's phone numbers will be deleted)
+        :return: True if removed
+        """
+        if phone:
+            await self.pool.execute(ASYNC_STATEMENTS['delete_phone'], client_id, phone.id)
+        else:
+            await self.pool.execute(ASYNC_STATEMENTS['delete_client_phones'], client_id)
+        return True
+
+
+class AsyncClient(Client):
+    __slots__ = ()
+
+    first_name = property(Client.first_name.fget)
+    last_name = property(Client.last_name.fget)
+    email = property(Client.email.fget)
+
+    async def change(self, prop: str, value):
+        """
+        :param prop: first_name, last_name or email
+        :param value: new value
+        :return: True if changed
+        """
+        if not self._id:
+            raise Exception('Client not exist')
+        if await self.clients.change(self._id, prop, value):
+            setattr(self, f'_{prop}', value)
+            return True
+        return False
+
+    async def phones(self):
+        """
+        :return: list of client`s phones numbers, cached until the numbers are changed through this instance
+        """
+        if not self._id:
+            raise Exception('Client not exist')
+        if self._phones is None:
+            self.cache_phones(await self.clients.list_phone(self._id))
+        return list(self._phones)
+
+    async def add_phone(self, phone: str):
+        """
+        :param phone: phone number
+        :return: Phone instance if added
+        """
+        if not self._id:
+            raise Exception('Client not exist')
+        self._phones = None
+        if phone := await self.clients.add_phone(self._id, phone):
+            phone.client = self
+            return phone
+
+    async def change_phone(self, old: Phone, new: str):
+        """
+        :param old: the phone number must be an instance of the Phone
+        :param new: phone number
+        :return: True if changed
+        """
+        if not self._id:
+            raise Exception('Client not exist')
+        new = Phone.parse(new)
+        self._phones = None
+        if await self.clients.change(self._id, 'phone', old.id, new):
+            return True
+
+    async def remove_phone(self, phone: Phone):
+        """
+        :param phone: phone number to delete
+        :return: True if removed
+        """
+        if not self._id:
+            raise Exception('Client not exist')
+        self._phones = None
+        return await self.clients.remove_phone(self._id, phone)
+
+    async def remove(self):
+        """
+        :return: True if removed
+        """
+        if await self.clients.remove(self._id):
+            self._id = None
+            self._first_name = None
+            self._last_name = None
+            self._email = None
+            self._phones = None
+            return True
@@ -0,0 +1,97 @@
+import argparse
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from main import Clients, DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+from aio import AsyncClients
+
+CONCURRENCY = [1, 10, 100]
+CLIENT_COUNT = 10000
+REQUEST_COUNT = 5000
+
+
+def lookup_numbers(count: int, seed: int = 0):
+    """
+    :param count: number of lookups
+    :param seed: random seed
+    :return: list of phone numbers to look up
+    """
+    rng = random.Random(seed)
+    return [f'7900{rng.randrange(CLIENT_COUNT):07d}' for _ in range(count)]
+
+
+def prepare_data(clients: Clients):
+    """
+    :param clients: Clients instance
+    :return: recreates the schema and fills it with CLIENT_COUNT clients with one phone number each
+    """
+    clients.create_schema()
+    clients.add_many([
+        {'first_name': f'name{i}', 'last_name': f'surname{i}', 'email': f'client{i}@example.com',
+         'phones': [f'7900{i:07d}']}
+        for i in range(CLIENT_COUNT)
+    ])
+
+
+def bench_sync(connection: dict, concurrency: int, numbers: list):
+    """
+    :param connection: database connection parameters
+    :param concurrency: number of threads
+    :param numbers: phone numbers to look up
+    :return: lookups per second of Clients called from a thread pool
+    """
+    clients = Clients(**connection, min_size=concurrency, max_size=concurrency)
+
+    def lookup(number):
+        return clients.find({'phone': number}, prefetch_phones=True)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        list(executor.map(lookup, numbers))
+    elapsed = time.perf_counter() - started
+    clients.close()
+    return len(numbers) / elapsed
+
+
+async def bench_async(connection: dict, concurrency: int, numbers: list):
+    """
+    :param connection: database connection parameters
+    :param concurrency: number of concurrent callers
+    :param numbers: phone numbers to look up
+    :return: lookups per second of AsyncClients called with asyncio.gather
+    """
+    async with await AsyncClients.connect(**connection, min_size=min(concurrency, 10), max_size=concurrency) \
+            as clients:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def lookup(number):
+            async with semaphore:
+                return await clients.find({'phone': number}, prefetch_phones=True)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[lookup(number) for number in numbers])
+        return len(numbers) / (time.perf_counter() - started)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares lookup throughput of Clients and AsyncClients')
+    parser.add_argument('--database', default=DB_NAME)
+    parser.add_argument('--user', default=DB_USER)
+    parser.add_argument('--password', default=DB_PASSWORD)
+    parser.add_argument('--host', default=DB_HOST)
+    parser.add_argument('--port', default=DB_PORT)
+    parser.add_argument('--requests', type=int, default=REQUEST_COUNT)
+    parser.add_argument('--skip-prepare', action='store_true', help='use the existing data')
+    args = parser.parse_args()
+    connection = {
+        'database': args.database, 'user': args.user, 'password': args.password, 'host': args.host, 'port': args.port
+    }
+    if not args.skip_prepare:
+        prepare_data(Clients(**connection))
+    numbers = lookup_numbers(args.requests)
+    print(f'{"callers":>8} {"sync, req/s":>14} {"async, req/s":>14}')
+    for concurrency in CONCURRENCY:
+        sync_rate = bench_sync(connection, concurrency, numbers)
+        async_rate = asyncio.run(bench_async(connection, concurrency, numbers))
+        print(f'{concurrency:>8} {sync_rate:>14.0f} {async_rate:>14.0f}')
@@ -0,0 +1,142 @@
+import argparse
+import random
+import sys
+import time
+from main import Clients, DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+
+CLIENT_COUNT = 100000
+RUNS = 5
+SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'sen', 'tor', 'vel', 'dan', 'gri', 'zu', 'pes', 'nov', 'bar', 'lin', 'shu', 'ek']
+# name -> (searched field, search mode, function of the field value of a sample client returning the searched value),
+# the phone is always compared exactly
+CASES = {
+    'exact': ('last_name', 'exact', lambda value: value.upper()),
+    'prefix': ('last_name', 'prefix', lambda value: value[:5]),
+    'contains': ('email', 'contains', lambda value: value[3:10]),
+    'similar': ('last_name', 'similar', lambda value: value[:-1]),
+    'phone': ('phone', None, lambda value: value),
+}
+# the similarity operator exists only with the pg_trgm extension, substrings are searched by its indexes
+TRIGRAM_CASES = ['similar']
+TRIGRAM_INDEX_CASES = ['contains', 'similar']
+
+
+def sample_clients(count: int, seed: int = 0):
+    """
+    :param count: number of clients
+    :param seed: random seed
+    :return: list of dicts for Clients.add_many with random names and one phone number each
+    """
+    rng = random.Random(seed)
+
+    def word(size: int):
+        return ''.join(rng.choice(SYLLABLES) for _ in range(size)).title()
+
+    result = []
+    for i in range(count):
+        first_name, last_name = word(2), word(4)
+        result.append({
+            'first_name': first_name, 'last_name': last_name,
+            'email': f'{first_name}.{last_name}{i}@example.com'.lower(), 'phones': [f'79{i:09d}'],
+        })
+    return result
+
+
+def prepare_data(clients: Clients, count: int):
+    """
+    :param clients: Clients instance
+    :param count: number of clients
+    :return: recreates the schema with the search indexes, fills it and collects the planner statistics
+    """
+    clients.create_schema()
+    clients.add_many(sample_clients(count))
+    with clients.pool.connection() as connection, connection.cursor() as cur:
+        cur.execute('ANALYZE client; ANALYZE client_phone;')
+
+
+def plan_scans(plan: dict):
+    """
+    :param plan: node of EXPLAIN (FORMAT JSON)
+    :return: list of the scans of the plan like 'Bitmap Index Scan on client_last_name_trgm_idx'
+    """
+    result = []
+    if plan['Node Type'].endswith('Scan'):
+        result.append(f'{plan["Node Type"]} on {plan.get("Index Name") or plan.get("Relation Name")}')
+    for child in plan.get('Plans', []):
+        result += plan_scans(child)
+    return result
+
+
+def search_queries(clients: Clients, count: int):
+    """
+    :param clients: Clients instance with the data of prepare_data
+    :param count: number of clients
+    :return: {case: (searched value, query, params)} of the search queries of CASES for a client from the middle
+    """
+    sample = clients.list(limit=1, after_id=count // 2)[0]
+    values = {
+        'first_name': sample.first_name, 'last_name': sample.last_name, 'email': sample.email,
+        'phone': clients.list_phone(sample.id)[0].number,
+    }
+    result = {}
+    for name, (field, mode, value) in CASES.items():
+        filters = {field: value(values[field])}
+        result[name] = (filters[field], *Clients._select_query(filters, modes={field: mode} if mode else None))
+    return result
+
+
+def seq_scans(scans: list):
+    """
+    :param scans: scans returned by plan_scans
+    :return: the scans reading whole tables
+    """
+    return [scan for scan in scans if scan.startswith('Seq Scan')]
+
+
+def measure(cur, query: str, params: tuple, runs: int):
+    """
+    :return: (scans of the plan, average milliseconds)
+    """
+    cur.execute(f'EXPLAIN (FORMAT JSON) {query}', params)
+    plan = cur.fetchone()[0]
+    started = time.perf_counter()
+    for _ in range(runs):
+        cur.execute(query, params)
+        cur.fetchall()
+    return plan_scans(plan[0]['Plan']), (time.perf_counter() - started) * 1000 / runs
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Checks that the client search queries use the indexes')
+    parser.add_argument('--database', default=DB_NAME)
+    parser.add_argument('--user', default=DB_USER)
+    parser.add_argument('--password', default=DB_PASSWORD)
+    parser.add_argument('--host', default=DB_HOST)
+    parser.add_argument('--port', default=DB_PORT)
+    parser.add_argument('--clients', type=int, default=CLIENT_COUNT)
+    parser.add_argument('--runs', type=int, default=RUNS)
+    parser.add_argument('--skip-prepare', action='store_true', help='use the existing data')
+    args = parser.parse_args()
+
+    clients = Clients(database=args.database, user=args.user, password=args.password, host=args.host,
+                      port=args.port)
+    if not args.skip_prepare:
+        started = time.perf_counter()
+        prepare_data(clients, args.clients)
+        print(f'Добавлено клиентов: {args.clients} за {time.perf_counter() - started:.2f} с')
+    trigram = clients.create_indexes()
+    failed = False
+    print(f'{"mode":<10} {"value":<16} {"ms":>8}  scans')
+    with clients.pool.connection() as connection, connection.cursor() as cur:
+        for name, (value, query, params) in search_queries(clients, args.clients).items():
+            if name in TRIGRAM_CASES and not trigram:
+                print(f'{name:<10} пропущен: расширение pg_trgm недоступно')
+                continue
+            scans, elapsed = measure(cur, query, params, args.runs)
+            print(f'{name:<10} {value:<16} {elapsed:>8.2f}  {", ".join(scans)}')
+            failed = failed or bool(seq_scans(scans))
+    clients.close()
+    if failed:
+        print('Поисковые запросы читают таблицы целиком (Seq Scan)')
+        sys.exit(1)
+    print('Все поисковые запросы используют индексы')
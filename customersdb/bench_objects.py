@@ -0,0 +1,119 @@
+import argparse
+import random
+import re
+import time
+import tracemalloc
+from main import Client, Phone, InvalidPhoneFormat
+
+OBJECT_COUNT = 200000
+
+
+class LegacyPhone:
+    """
+    Phone as it was implemented before __slots__ and precompiled patterns, kept for comparison
+    """
+    def __init__(self, phone_number: str, phone_id: int, client=None):
+        self._id = phone_id
+        self._client = client
+        self._number = self.__class__.parse(phone_number)
+
+    def __str__(self):
+        return re.sub(r'^(\d{1,2})(\d{3})(\d{3})(\d{2})(\d{2})', r'+\1 (\2) \3 \4-\5', self._number)
+
+    @staticmethod
+    def parse(phone_number: str):
+        if re.match(r'^\d{1,2}\d{10}$', phone_number):
+            return phone_number
+        phone = re.sub(r'\D', '', phone_number)
+        if not re.match(r'^\d{1,2}\d{10}$', phone):
+            raise InvalidPhoneFormat('Invalid phone number format')
+        return phone
+
+
+class LegacyClient:
+    """
+    Client as it was implemented before __slots__, kept for comparison
+    """
+    def __init__(self, parent, client_id: int, first_name: str, last_name: str, email: str):
+        self.clients = parent
+        self._id = client_id
+        self._first_name = first_name
+        self._last_name = last_name
+        self._email = email
+
+
+def sample_numbers(count: int, seed: int = 0):
+    """
+    :param count: number of phone numbers
+    :param seed: random seed
+    :return: formatted phone numbers, every 100th number is invalid
+    """
+    rng = random.Random(seed)
+    return [
+        f'+7 ({rng.randrange(1000):03d}) {rng.randrange(1000):03d} {rng.randrange(100):02d}-{rng.randrange(100):02d}'
+        if i % 100 else f'+7 {rng.randrange(1000)}'
+        for i in range(count)
+    ]
+
+
+def measure(create, count: int):
+    """
+    :param create: function creating an object by its index
+    :param count: number of objects
+    :return: objects per second and bytes per object
+    """
+    started = time.perf_counter()
+    objects = [create(i) for i in range(count)]
+    rate = count / (time.perf_counter() - started)
+    del objects
+    tracemalloc.start()
+    objects = [create(i) for i in range(count)]
+    size = tracemalloc.get_traced_memory()[0] / count
+    tracemalloc.stop()
+    del objects
+    return rate, size
+
+
+def legacy_parse_many(numbers: list):
+    result, errors = [], []
+    for i, number in enumerate(numbers):
+        try:
+            result.append(LegacyPhone.parse(number))
+        except InvalidPhoneFormat as e:
+            result.append(None)
+            errors.append((i, number, str(e)))
+    return result, errors
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares the Client/Phone implementations')
+    parser.add_argument('--count', type=int, default=OBJECT_COUNT)
+    args = parser.parse_args()
+    numbers = sample_numbers(args.count)
+    normalized = [number for number in Phone.parse_many(numbers)[0] if number]
+
+    print(f'{"":<28} {"before, obj/s":>14} {"after, obj/s":>14} {"before, B":>10} {"after, B":>10}')
+    rows = [
+        ('Client', lambda i: LegacyClient(None, i, 'Имя', 'Фамилия', 'client@example.com'),
+         lambda i: Client(None, i, 'Имя', 'Фамилия', 'client@example.com')),
+        ('Phone from database row', lambda i: LegacyPhone(normalized[i % len(normalized)], i),
+         lambda i: Phone.from_row(normalized[i % len(normalized)], i)),
+    ]
+    for name, legacy, current in rows:
+        legacy_rate, legacy_size = measure(legacy, args.count)
+        rate, size = measure(current, args.count)
+        print(f'{name:<28} {legacy_rate:>14.0f} {rate:>14.0f} {legacy_size:>10.0f} {size:>10.0f}')
+
+    phones = [Phone.from_row(number, i) for i, number in enumerate(normalized)]
+    legacy_phones = [LegacyPhone(number, i) for i, number in enumerate(normalized)]
+    for name, legacy, current in [
+        ('parse many', lambda: legacy_parse_many(numbers), lambda: Phone.parse_many(numbers)),
+        ('format', lambda: [str(phone) for phone in legacy_phones], lambda: [str(phone) for phone in phones]),
+    ]:
+        started = time.perf_counter()
+        legacy()
+        legacy_rate = len(numbers) / (time.perf_counter() - started)
+        started = time.perf_counter()
+        current()
+        rate = len(numbers) / (time.perf_counter() - started)
+        print(f'{name:<28} {legacy_rate:>14.0f} {rate:>14.0f}')
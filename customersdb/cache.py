@@ -0,0 +1,179 @@
+import collections
+import json
+import select
+import threading
+import time
+
+CACHE_SIZE = 10000
+CACHE_TTL = 60
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes and longer
+NOTIFY_MAX_PAYLOAD = 7900
+
+
+class ClientCache:
+    def __init__(self, max_size=CACHE_SIZE, ttl=CACHE_TTL, channel: str = None):
+        """
+        :param max_size: max number of entries, least recently used entries are evicted
+        :param ttl: entry lifetime in seconds
+        :param channel: LISTEN/NOTIFY channel used to invalidate the caches of other processes (None - disabled)
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.channel = channel
+        self._entries = collections.OrderedDict()
+        self._phone_keys = collections.defaultdict(set)
+        self._lock = threading.Lock()
+        self._listener = None
+        self._stop = threading.Event()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: tuple):
+        """
+        :param key: ('client', client_id) - client row, ('phones', client_id) - rows of the client phones
+        or ('phone', normalized number) - rows of the clients with this number
+        :return: cached value or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def generation(self):
+        """
+        :return: number of invalidations so far, pass it to set to skip values read before an invalidation
+        """
+        with self._lock:
+            return self._generation
+
+    def set(self, key: tuple, value, generation: int = None):
+        """
+        :param key: same as in get
+        :param value: immutable value (a row or a tuple of rows)
+        :param generation: value of generation() taken before the value was read from the database
+        :return: None
+        """
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            if key[0] == 'phone':
+                for row in value:
+                    self._phone_keys[row[0]].add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: tuple):
+        _, value = self._entries.pop(key)
+        if key[0] == 'phone':
+            for client_id, *_ in value:
+                keys = self._phone_keys.get(client_id)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._phone_keys[client_id]
+
+    def invalidate(self, client_ids=(), numbers=()):
+        """
+        :param client_ids: IDs of changed clients, their data, phone lists and phone lookups are removed
+        :param numbers: changed (added, removed) normalized phone numbers
+        :return: None
+        """
+        with self._lock:
+            self._generation += 1
+            keys = set(('phone', number) for number in numbers)
+            for client_id in client_ids:
+                keys.update([('client', client_id), ('phones', client_id)])
+                keys.update(self._phone_keys.get(client_id, ()))
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def notify(self, cur, client_ids=(), numbers=()):
+        """
+        :param cur: psycopg2 cursor of the transaction that changes the data
+        :param client_ids: same as in invalidate
+        :param numbers: same as in invalidate
+        :return: sends the invalidation to the other processes, it is delivered when the transaction commits;
+        the entries are split into notifications shorter than NOTIFY_MAX_PAYLOAD bytes
+        """
+        if not self.channel:
+            return
+        empty = {'clients': [], 'phones': []}
+        payload, size = {'clients': [], 'phones': []}, len(json.dumps(empty))
+        for key, value in [*(('clients', item) for item in client_ids), *(('phones', item) for item in numbers)]:
+            item_size = len(json.dumps(value).encode()) + 2
+            if size + item_size > NOTIFY_MAX_PAYLOAD and payload != empty:
+                cur.execute('SELECT pg_notify(%s, %s);', (self.channel, json.dumps(payload)))
+                payload, size = {'clients': [], 'phones': []}, len(json.dumps(empty))
+            payload[key].append(value)
+            size += item_size
+        if payload != empty:
+            cur.execute('SELECT pg_notify(%s, %s);', (self.channel, json.dumps(payload)))
+
+    def start_listener(self, connect):
+        """
+        :param connect: function returning a new psycopg2 connection used only for LISTEN
+        :return: starts a daemon thread applying invalidations received on the channel
+        """
+        if not self.channel or self._listener:
+            return
+        connection = connect()
+        connection.autocommit = True
+        with connection.cursor() as cur:
+            cur.execute(f'LISTEN "{self.channel}";')
+        self._listener = threading.Thread(target=self._listen, args=(connection,), daemon=True)
+        self._listener.start()
+
+    def stop_listener(self):
+        """
+        :return: stops the listener thread
+        """
+        if self._listener:
+            self._stop.set()
+            self._listener.join()
+            self._listener = None
+            self._stop.clear()
+
+    def _listen(self, connection):
+        try:
+            while not self._stop.is_set():
+                if select.select([connection], [], [], 1)[0]:
+                    connection.poll()
+                    while connection.notifies:
+                        payload = json.loads(connection.notifies.pop(0).payload)
+                        self.invalidate(payload.get('clients', ()), payload.get('phones', ()))
+        finally:
+            connection.close()
+
+    def stats(self):
+        """
+        :return: cache statistics
+        """
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
@@ -0,0 +1,62 @@
+import argparse
+import os
+import sys
+import time
+import psycopg2.extensions
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from copyexport import FORMATS, RANGES, guess_format, snapshot, copy_query, id_ranges, missing_ids, \
+    read_state, write_state
+
+CLIENTS_QUERY = '''
+    SELECT c.id, c.first_name, c.last_name, c.email,
+        {phones} AS phones
+    FROM client c
+    {ranges}
+    ORDER BY c.id
+'''
+PHONES = 'ARRAY(SELECT p.phone FROM client_phone p WHERE p.client_id = c.id ORDER BY p.id)'
+
+
+def export_clients(cursor: psycopg2.extensions.cursor, output, format: str = 'csv', since_id: int = 0,
+                   gaps: list = None):
+    """
+    :param cursor: psycopg2 cursor
+    :param output: binary file
+    :param format: csv or jsonl
+    :param since_id: export the clients with ID greater than this one (the last_id of the previous export)
+    :param gaps: gaps of the previous export, the clients committed in them are exported too
+    :return: writes the clients ordered by ID with their phone numbers (a list in jsonl, comma separated in csv),
+    returns {'rows': ..., 'last_id': ..., 'gaps': ...}; the ID bound and the rows are read from one snapshot,
+    only new clients are exported incrementally, changes of the exported ones are not. A client ID is taken
+    before the transaction commits, so a client committed later may have an ID below last_id: the missing IDs
+    are returned as gaps and a client is exported exactly once if it commits within copyexport.GAP_TIMEOUT
+    and the gaps are passed to the next export
+    """
+    snapshot(cursor)
+    last_id, params = id_ranges(cursor, 'client', since_id, gaps)
+    phones = PHONES if format == 'jsonl' else f"array_to_string({PHONES}, ',')"
+    rows = copy_query(cursor, CLIENTS_QUERY.format(phones=phones, ranges=RANGES.format(id='c.id')), params,
+                      output, format)
+    return {'rows': rows, 'last_id': last_id, 'gaps': missing_ids(cursor, 'client', params)}
+
+
+if __name__ == '__main__':
+    from main import Clients
+
+    parser = argparse.ArgumentParser(description='Exports clients with their phone numbers')
+    parser.add_argument('output', help='file (.gz - compressed) or - for stdout')
+    parser.add_argument('--format', choices=FORMATS, help='by the file extension by default')
+    parser.add_argument('--since-id', type=int, default=0, help='last_id of the previous export')
+    parser.add_argument('--state', help='JSON file with last_id and gaps, read before and written after the export')
+    args = parser.parse_args()
+
+    state = read_state(args.state) if args.state else {'last_id': args.since_id, 'gaps': []}
+    clients = Clients()
+    started = time.perf_counter()
+    result = clients.export(args.output, args.format or guess_format(args.output), state['last_id'], state['gaps'])
+    clients.close()
+    if args.state:
+        write_state(args.state, result)
+    print(f'Выгружено клиентов: {result["rows"]} за {time.perf_counter() - started:.2f} с, '
+          f'последний ID: {result["last_id"]}', file=sys.stderr)
@@ -1,57 +1,179 @@
 import psycopg2
+import psycopg2.extras
 import sys
+import os
+import atexit
 import re
+import json
+import hashlib
+import itertools
+import contextlib
+import export
+from pool import ConnectionPool
+from cache import ClientCache
+from statements import PreparingConnection, StatementRegistry, VARIANTS_CACHE_SIZE
 
 DB_NAME = 'postgres'
 DB_USER = 'postgres'
 DB_PASSWORD = ''
 DB_HOST = '127.0.0.1'
 DB_PORT = None
+DB_POOL_MIN_SIZE = 1
+DB_POOL_MAX_SIZE = 10
 PAGE_SIZE = 5
+SCHEMA_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'customersdb_schema.json')
+SCHEMA = {
+    'client': [('id', 'integer'), ('first_name', 'text'), ('last_name', 'text'), ('email', 'text')],
+    'client_phone': [('id', 'integer'), ('client_id', 'integer'), ('phone', 'text')]
+}
+BATCH_PAGE_SIZE = 1000
+ITER_SIZE = 2000
+SEARCH_FIELDS = ['first_name', 'last_name', 'email']
+SEARCH_MODES = ['contains', 'prefix', 'exact', 'similar']
+DEFAULT_SEARCH_MODE = 'contains'
+PHONE_NUMBER = re.compile(r'\d{1,2}\d{10}')
+NON_DIGITS = re.compile(r'\D')
+STATEMENTS = {
+    'insert_client': 'INSERT INTO client(first_name, last_name, email) VALUES (%s, %s, %s) RETURNING id',
+    'insert_phone': 'INSERT INTO client_phone (client_id, phone) VALUES (%s, %s) RETURNING id',
+    'get_client': 'SELECT id, first_name, last_name, email FROM client WHERE id=%s',
+    'find_by_phone': 'SELECT client.id, client.first_name, client.last_name, client.email FROM client '
+                     'WHERE EXISTS (SELECT 1 FROM client_phone WHERE client_phone.client_id = client.id '
+                     'AND client_phone.phone = %s) ORDER BY client.id',
+    'list_phones': 'SELECT id, phone FROM client_phone WHERE client_id=%s',
+    'list_phones_many': 'SELECT id, client_id, phone FROM client_phone WHERE client_id = ANY(%s) ORDER BY id',
+    'update_phone': 'UPDATE client_phone SET phone=%s WHERE id=%s RETURNING id',
+    'update_first_name': 'UPDATE client SET first_name=%s WHERE id=%s RETURNING id',
+    'update_last_name': 'UPDATE client SET last_name=%s WHERE id=%s RETURNING id',
+    'update_email': 'UPDATE client SET email=%s WHERE id=%s RETURNING id',
+    'delete_client': 'DELETE FROM client WHERE id=%s RETURNING id',
+    'delete_client_phones': 'DELETE FROM client_phone WHERE client_id = %s RETURNING id',
+    'delete_phone': 'DELETE FROM client_phone WHERE client_id = %s AND id=%s RETURNING id',
+    'delete_clients_many': 'DELETE FROM client WHERE id = ANY(%s)',
+    'delete_phones_many': 'DELETE FROM client_phone WHERE client_id = ANY(%s)',
+}
 
 
 class InvalidPhoneFormat(Exception):
     pass
 
 
-def postgres_table_diff(cursor: psycopg2.extensions.cursor, params: dict):
+def escape_like(value: str):
+    """
+    :param value: string to search for
+    :return: the string with LIKE wildcards escaped
+    """
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def postgres_table_columns(cursor: psycopg2.extensions.cursor, tables: list):
     """
     :param cursor: psycopg2 cursor
+    :param tables: table names
+    :return: sorted list of (table, column, data_type) of the visible tables read from pg_catalog in one query
+    """
+    if not tables:
+        return []
+    cursor.execute('''
+        SELECT c.relname, a.attname, pg_catalog.format_type(a.atttypid, NULL)
+        FROM pg_catalog.pg_attribute a
+        JOIN pg_catalog.pg_class c ON c.oid = a.attrelid
+        WHERE c.relname = ANY(%s) AND c.relkind IN ('r', 'p') AND pg_catalog.pg_table_is_visible(c.oid)
+            AND a.attnum > 0 AND NOT a.attisdropped
+        ORDER BY 1, 2;
+    ''', (list(tables),))
+    return cursor.fetchall()
+
+
+def table_diff(columns: list, params: dict):
+    """
+    :param columns: list of (table, column, data_type) returned by postgres_table_columns
     :param params: should be like {table_name: [(column, data_type), ...] }
-    :return: True if one of the tables does not match the specified parameters
+    :return: differences between the columns and the specified parameters like
+    {'missing': [(table, column, data_type), ...], 'extra': [(table, column, data_type), ...],
+    'mistyped': [(table, column, expected_type, actual_type), ...]}, only non-empty keys are included,
+    an empty dict if the tables match the parameters
     """
-    tables = params.keys()
-    if tables == '':
-        return None
-    mask = ('%s,' * len(tables))[:-1]
-    query = f'SELECT table_name, column_name, data_type FROM information_schema.columns WHERE table_name IN ({mask});'
-    cursor.execute(query, tuple(tables))
-    schema = cursor.fetchall()
-    if not len(schema):
-        return True
-    checked = set()
-    data = [
-        (table_name, column[0], column[1])
-        for table_name, columns in params.items()
-        for column in columns
-    ]
-    for column in schema:
-        i = data.index(column)
-        if i >= 0:
-            checked.add(i)
-        else:
-            return True
-    return False if len(checked) == len(data) else True
+    actual = {(table, column): data_type for table, column, data_type in columns}
+    expected = {(table, column): data_type for table, columns in params.items() for column, data_type in columns}
+    diff = {
+        'missing': sorted((*key, expected[key]) for key in expected.keys() - actual.keys()),
+        'extra': sorted((*key, actual[key]) for key in actual.keys() - expected.keys()),
+        'mistyped': sorted(
+            (*key, expected[key], actual[key]) for key in expected.keys() & actual.keys() if expected[key] != actual[key]
+        ),
+    }
+    return {key: value for key, value in diff.items() if value}
+
+
+def postgres_table_diff(cursor: psycopg2.extensions.cursor, params: dict):
+    """
+    :param cursor: psycopg2 cursor
+    :param params: same as in table_diff
+    :return: differences between the database and the specified parameters (see table_diff)
+    """
+    return table_diff(postgres_table_columns(cursor, list(params)), params)
+
+
+def schema_fingerprint(columns: list, params: dict):
+    """
+    :param columns: catalog rows returned by postgres_table_columns
+    :param params: expected schema, same as in table_diff
+    :return: hash of the catalog rows and of the expected schema
+    """
+    return hashlib.sha256(json.dumps([columns, params], sort_keys=True).encode()).hexdigest()
+
+
+def read_schema_cache(path: str = SCHEMA_CACHE_PATH):
+    """
+    :param path: path to the cache file
+    :return: {server identity: {'fingerprint': ...}}
+    """
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_schema_cache(cache: dict, path: str = SCHEMA_CACHE_PATH):
+    """
+    :param cache: same as returned by read_schema_cache
+    :param path: path to the cache file
+    :return: saves the cache, errors are ignored since the cache is optional
+    """
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump(cache, file)
+    except OSError:
+        pass
 
 
 class Phone:
+    __slots__ = ('_id', '_client', '_number')
+
     def __init__(self, phone_number: str, phone_id: int, client=None):
         self._id = phone_id
         self._client = client
         self._number = self.__class__.parse(phone_number)
 
+    @classmethod
+    def from_row(cls, phone_number: str, phone_id: int):
+        """
+        :param phone_number: normalized phone number read from the database (checked by the table constraint)
+        :param phone_id: phone ID in the database
+        :return: Phone instance created without parsing the number
+        """
+        phone = cls.__new__(cls)
+        phone._id = phone_id
+        phone._client = None
+        phone._number = phone_number
+        return phone
+
     def __str__(self):
-        return re.sub(r'^(\d{1,2})(\d{3})(\d{3})(\d{2})(\d{2})', r'+\1 (\2) \3 \4-\5', self._number)
+        number = self._number
+        return f'+{number[:-10]} ({number[-10:-7]}) {number[-7:-4]} {number[-4:-2]}-{number[-2:]}'
 
     def __repr__(self):
         return self.__str__()
@@ -62,13 +184,35 @@ class Phone:
         :param phone_number: phone number in international format
         :return: removes all characters from the string except numbers
         """
-        if re.match(r'^\d{1,2}\d{10}$', phone_number):
+        if PHONE_NUMBER.fullmatch(phone_number):
             return phone_number
-        phone = re.sub(r'\D', '', phone_number)
-        if not re.match(r'^\d{1,2}\d{10}$', phone):
+        phone = NON_DIGITS.sub('', phone_number)
+        if not PHONE_NUMBER.fullmatch(phone):
             raise InvalidPhoneFormat('Invalid phone number format')
         return phone
 
+    @staticmethod
+    def parse_many(phone_numbers):
+        """
+        :param phone_numbers: iterable of phone numbers in international format
+        :return: (numbers, errors) - list of normalized numbers in the input order (None for invalid ones)
+        and list of (index, value, error message) for the invalid numbers
+        """
+        fullmatch, sub = PHONE_NUMBER.fullmatch, NON_DIGITS.sub
+        numbers, errors = [], []
+        for i, value in enumerate(phone_numbers):
+            if not isinstance(value, str):
+                numbers.append(None)
+                errors.append((i, value, 'Phone number should be a string'))
+            elif fullmatch(value):
+                numbers.append(value)
+            elif fullmatch(phone := sub('', value)):
+                numbers.append(phone)
+            else:
+                numbers.append(None)
+                errors.append((i, value, 'Invalid phone number format'))
+        return numbers, errors
+
     @property
     def id(self):
         return self._id
@@ -89,34 +233,142 @@ class Phone:
 
 
 class Clients:
-    def __init__(self, database=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT):
+    def __init__(self, database=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT,
+                 pool: ConnectionPool = None, min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE,
+                 variants_cache_size=VARIANTS_CACHE_SIZE, cache: ClientCache = None, cursor_factory=None):
         """
         :param database: name of database
         :param user: user name
         :param password: password
         :param host: IP-address or domain name
         :param port: port
+        :param pool: shared connection pool, if not passed the instance creates its own pool
+        :param min_size: min number of connections in the own pool
+        :param max_size: max number of connections in the own pool
+        :param variants_cache_size: max number of prepared search query variants per connection
+        (statements are prepared only on connections created with PreparingConnection)
+        :param cache: read-through cache of clients and phones (disabled if not passed),
+        if the cache has a channel, invalidations are also received from other processes
+        :param cursor_factory: cursor class of the own pool connections,
+        e.g. sqlmetrics.cursor.metrics_cursor_factory() to collect statement timings
         """
-        self.connection = psycopg2.connect(database=database, user=user, password=password, host=host, port=port)
+        self._own_pool = pool is None
+        self._cursor_ids = itertools.count()
+        self.statements = StatementRegistry(STATEMENTS, variants_cache_size)
+        self.pool = pool or ConnectionPool(min_size, max_size, database=database, user=user, password=password,
+                                           host=host, port=port, connection_factory=PreparingConnection,
+                                           cursor_factory=cursor_factory)
+        self.cache = cache
+        if cache is not None and cache.channel:
+            cache.start_listener(self.pool.dedicated_connection)
 
     def __del__(self):
-        self.connection.close()
+        if getattr(self, '_own_pool', False):
+            self.close()
+
+    def close(self):
+        """
+        :return: closes all connections of the own pool
+        """
+        if self._own_pool and not self.pool.closed:
+            self.pool.closeall()
+
+    def pool_stats(self):
+        """
+        :return: connection pool statistics (wait time, connections in use, created, etc.)
+        """
+        return self.pool.stats()
+
+    def statement_stats(self):
+        """
+        :return: prepared statement cache statistics (hits, misses, evictions)
+        """
+        return self.statements.stats()
+
+    def cache_stats(self):
+        """
+        :return: cache statistics (hits, misses, evictions, etc.) or None if the cache is disabled
+        """
+        return self.cache.stats() if self.cache is not None else None
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """
+        :return: context manager with a cursor and sets of changed client IDs and phone numbers,
+        the changed entries are invalidated in the cache (and in other processes) when the transaction commits
+        """
+        client_ids, numbers = set(), set()
+        with self.pool.connection() as connection, connection.cursor() as cur:
+            yield cur, client_ids, numbers
+            if self.cache is not None:
+                self.cache.notify(cur, client_ids, numbers)
+        if self.cache is not None:
+            self.cache.invalidate(client_ids, numbers)
+
+    def _cached(self, key: tuple, statement: str, params: tuple, fetch_one=False):
+        """
+        :param key: cache key
+        :param statement: name of the statement reading the value
+        :param params: statement parameters
+        :param fetch_one: the value is one row (an empty tuple if not found)
+        :return: value from the cache or from the database
+        """
+        if self.cache is not None:
+            value = self.cache.get(key)
+            if value is not None:
+                return value
+            generation = self.cache.generation()
+        with self.pool.connection() as connection, connection.cursor() as cur:
+            self.statements.execute(cur, statement, params)
+            value = (cur.fetchone() or ()) if fetch_one else tuple(cur.fetchall())
+        if self.cache is not None:
+            self.cache.set(key, tuple(value), generation)
+        return tuple(value)
+
+    def server_identity(self):
+        """
+        :return: string identifying the database server and the database (without a round trip)
+        """
+        with self.pool.connection() as connection:
+            params = connection.info.dsn_parameters
+            return f'{params.get("host")}:{params.get("port")}/{params.get("dbname")}@{connection.server_version}'
 
-    def check_schema(self):
+    def schema_diff(self, use_cache=False):
         """
-        :return: True if all tables exist in the database
+        :param use_cache: skip comparing the columns if the catalog rows of the tables have the same fingerprint
+        as when the schema of this database was last verified (cached in SCHEMA_CACHE_PATH)
+        :return: differences between the database and the expected schema (see table_diff),
+        the catalog is read with one query
         """
-        with self.connection.cursor() as cur:
-            return not postgres_table_diff(cur, {
-                    'client': [('id', 'integer'), ('first_name', 'text'), ('last_name', 'text'), ('email', 'text')],
-                    'client_phone': [('id', 'integer'), ('client_id', 'integer'), ('phone', 'text')]
-                })
+        with self.pool.connection() as connection, connection.cursor() as cur:
+            columns = postgres_table_columns(cur, list(SCHEMA))
+        identity = self.server_identity()
+        fingerprint = schema_fingerprint(columns, SCHEMA)
+        cache = read_schema_cache()
+        if use_cache and cache.get(identity, {}).get('fingerprint') == fingerprint:
+            return {}
+        diff = table_diff(columns, SCHEMA)
+        if diff.get('missing') or diff.get('mistyped'):
+            cache.pop(identity, None)
+        else:
+            cache[identity] = {'fingerprint': fingerprint}
+        write_schema_cache(cache)
+        return diff
+
+    def check_schema(self, use_cache=True):
+        """
+        :param use_cache: same as in schema_diff
+        :return: True if all tables and columns exist in the database and have the expected types
+        (extra columns are allowed)
+        """
+        diff = self.schema_diff(use_cache)
+        return not diff.get('missing') and not diff.get('mistyped')
 
     def create_schema(self):
         """
         :return: Creates the necessary tables in the database, returns None
         """
-        with self.connection.cursor() as cur:
+        with self.pool.connection() as connection, connection.cursor() as cur:
             cur.execute('''
                 DROP TABLE IF EXISTS client_phone;
                 DROP TABLE IF EXISTS client;                    
@@ -127,7 +379,35 @@ class Clients:
                     phone TEXT CHECK(phone ~ '^\d{1,2}\d{10}$')
                 );
             ''')
-            self.connection.commit();
+        self.create_indexes()
+        cache = read_schema_cache()
+        if cache.pop(self.server_identity(), None):
+            write_schema_cache(cache)
+
+    def create_indexes(self):
+        """
+        :return: creates the search indexes if they do not exist: B-tree on LOWER(column) for prefix and exact search,
+        trigram GIN for substring and similarity search (if the pg_trgm extension is available)
+        and B-tree on the client_phone columns, returns True if the trigram indexes were created
+        """
+        with self.pool.connection() as connection, connection.cursor() as cur:
+            cur.execute('''
+                CREATE INDEX IF NOT EXISTS client_phone_phone_idx ON client_phone (phone);
+                CREATE INDEX IF NOT EXISTS client_phone_client_id_idx ON client_phone (client_id);
+            ''')
+            for column in SEARCH_FIELDS:
+                cur.execute(f'CREATE INDEX IF NOT EXISTS client_{column}_lower_idx '
+                            f'ON client (LOWER({column}) text_pattern_ops);')
+            cur.execute('SAVEPOINT pg_trgm;')
+            try:
+                cur.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm;')
+            except psycopg2.Error:
+                cur.execute('ROLLBACK TO SAVEPOINT pg_trgm;')
+                return False
+            for column in SEARCH_FIELDS:
+                cur.execute(f'CREATE INDEX IF NOT EXISTS client_{column}_trgm_idx '
+                            f'ON client USING gin ({column} gin_trgm_ops);')
+            return True
 
     def add(self, first_name=None, last_name=None, email=None):
         """
@@ -136,10 +416,8 @@ class Clients:
         :param email: client e-mail address
         :return: Adds the client to the database, returns a Client instance
         """
-        with self.connection.cursor() as cur:
-            cur.execute('INSERT INTO client(first_name, last_name, email) VALUES (%s, %s, %s) RETURNING id;',
-                        (first_name, last_name, email,))
-            self.connection.commit()
+        with self._transaction() as (cur, _, _):
+            self.statements.execute(cur, 'insert_client', (first_name, last_name, email,))
             client_id = cur.fetchone()[0]
             return Client(self, client_id, first_name, last_name, email)
 
@@ -157,20 +435,17 @@ class Clients:
                 raise Exception('To change phone number you should specify old number and then new phone number!')
             phone_id, new_number = params
             new_number = Phone.parse(new_number) if not isinstance(new_number, Phone) else new_number.number
-            with self.connection.cursor() as cur:
-                cur.execute('UPDATE client_phone SET phone=%s WHERE id=%s RETURNING id;', (new_number, phone_id,))
-                if cur.fetchone()[0] == phone_id:
-                    self.connection.commit()
-                    return True
-                return False
+            with self._transaction() as (cur, client_ids, numbers):
+                client_ids.add(client_id)
+                numbers.add(new_number)
+                self.statements.execute(cur, 'update_phone', (new_number, phone_id,))
+                return cur.fetchone()[0] == phone_id
         if prop not in ['first_name', 'last_name', 'email']:
             raise Exception(f'Unknown parameter {prop}')
-        with self.connection.cursor() as cur:
-            cur.execute(f'UPDATE client SET {prop}=%s WHERE id=%s RETURNING id;', (params[0], client_id,))
-            if cur.fetchone()[0] == client_id:
-                self.connection.commit()
-                return True
-            return False
+        with self._transaction() as (cur, client_ids, _):
+            client_ids.add(client_id)
+            self.statements.execute(cur, f'update_{prop}', (params[0], client_id,))
+            return cur.fetchone()[0] == client_id
 
     def add_phone(self, client_id: int, phone: str):
         """
@@ -179,62 +454,238 @@ class Clients:
         :return: adds a phone number for the specified client, returns an instance of Phone
         """
         phone_number = Phone.parse(phone)
-        with self.connection.cursor() as cur:
-            cur.execute('INSERT INTO client_phone (client_id, phone) VALUES (%s, %s) RETURNING id;', (client_id, phone_number,))
+        with self._transaction() as (cur, client_ids, numbers):
+            client_ids.add(client_id)
+            numbers.add(phone_number)
+            self.statements.execute(cur, 'insert_phone', (client_id, phone_number,))
             if phone_id := cur.fetchone()[0]:
-                self.connection.commit()
                 return Phone(phone_number, phone_id)
 
+    def add_many(self, clients: list, page_size=BATCH_PAGE_SIZE):
+        """
+        :param clients: list of dicts like {'first_name': ..., 'last_name': ..., 'email': ..., 'phones': [...]}
+        (all keys are optional)
+        :param page_size: max number of rows in one INSERT statement
+        :return: adds the clients and their phone numbers in one transaction,
+        returns a list of Client instances in the input order
+        """
+        numbers = [[Phone.parse(phone) for phone in item.get('phones', [])] for item in clients]
+        with self._transaction() as (cur, _, changed_numbers):
+            changed_numbers.update(number for client_numbers in numbers for number in client_numbers)
+            rows = psycopg2.extras.execute_values(
+                cur, 'INSERT INTO client (first_name, last_name, email) VALUES %s RETURNING id;',
+                [(item.get('first_name'), item.get('last_name'), item.get('email')) for item in clients],
+                page_size=page_size, fetch=True
+            )
+            result = [
+                Client(self, row[0], item.get('first_name'), item.get('last_name'), item.get('email'))
+                for row, item in zip(rows, clients)
+            ]
+            phones = self._insert_phones(cur, [
+                (client.id, number) for client, client_numbers in zip(result, numbers) for number in client_numbers
+            ], page_size)
+        client_phones = {client.id: [] for client in result}
+        for phone, (client_id, _) in phones:
+            client_phones[client_id].append(phone)
+        for client in result:
+            client.cache_phones(client_phones[client.id])
+        return result
+
+    def add_phones_many(self, phones: list, page_size=BATCH_PAGE_SIZE):
+        """
+        :param phones: list of (client_id, phone number) pairs
+        :param page_size: max number of rows in one INSERT statement
+        :return: adds the phone numbers in one transaction, returns a list of Phone instances in the input order
+        """
+        rows = [(client_id, Phone.parse(phone)) for client_id, phone in phones]
+        with self._transaction() as (cur, client_ids, numbers):
+            client_ids.update(client_id for client_id, _ in rows)
+            numbers.update(number for _, number in rows)
+            return [phone for phone, _ in self._insert_phones(cur, rows, page_size)]
+
+    @staticmethod
+    def _insert_phones(cur, rows: list, page_size: int):
+        """
+        :param cur: psycopg2 cursor
+        :param rows: list of (client_id, normalized phone number) pairs
+        :param page_size: max number of rows in one INSERT statement
+        :return: list of (Phone, row) pairs in the input order
+        """
+        if not rows:
+            return []
+        ids = psycopg2.extras.execute_values(
+            cur, 'INSERT INTO client_phone (client_id, phone) VALUES %s RETURNING id;', rows,
+            page_size=page_size, fetch=True
+        )
+        return [(Phone.from_row(row[1], phone_id[0]), row) for phone_id, row in zip(ids, rows)]
+
     def list_phone(self, client_id):
         """
         :param client_id: client ID in the database
         :return: list of client phone numbers
         """
-        with self.connection.cursor() as cur:
-            cur.execute('SELECT id, phone FROM client_phone WHERE client_id=%s;', (client_id,))
-            return [Phone(item[1], item[0]) for item in cur.fetchall()]
+        rows = self._cached(('phones', client_id), 'list_phones', (client_id,))
+        return [Phone.from_row(item[1], item[0]) for item in rows]
+
+    def get(self, client_id):
+        """
+        :param client_id: client ID in the database
+        :return: Client instance or None if not found
+        """
+        if row := self._cached(('client', client_id), 'get_client', (client_id,), fetch_one=True):
+            return Client(self, *row)
+
+    def find_by_phone(self, phone: str):
+        """
+        :param phone: phone number in international format
+        :return: list of clients with this phone number
+        """
+        number = Phone.parse(phone)
+        return [Client(self, *row) for row in self._cached(('phone', number), 'find_by_phone', (number,))]
 
-    def list(self):
+    def list(self, prefetch_phones=False, limit=None, after_id=None):
         """
-        :return: list of clients
+        :param prefetch_phones: load phone numbers of all found clients with one additional query
+        :param limit: max number of clients (page size)
+        :param after_id: return clients with ID greater than this one (ID of the last client of the previous page)
+        :return: list of clients ordered by ID
         """
-        with self.connection.cursor() as cur:
-            cur.execute('SELECT * FROM client;')
-            return [Client(self, *client) for client in cur.fetchall()]
+        return self.find({}, prefetch_phones, limit, after_id)
 
-    def find(self, filters: dict):
+    def find(self, filters: dict, prefetch_phones=False, limit=None, after_id=None, modes: dict = None):
         """
         :param filters: should be like {column_name: value, ...}, for example {'first_name': 'Client`s first name'}
-        :return: list of clients
+        :param prefetch_phones: load phone numbers of all found clients with one additional query
+        :param limit: max number of clients (page size)
+        :param after_id: return clients with ID greater than this one (ID of the last client of the previous page)
+        :param modes: search mode per column like {'last_name': 'prefix'}, one of SEARCH_MODES:
+        contains - case-insensitive substring (default), prefix - case-insensitive prefix,
+        exact - case-insensitive equality, similar - trigram similarity; the phone is always compared exactly
+        :return: list of clients ordered by ID
+        """
+        if self.cache is not None and list(filters) == ['phone'] and limit is None and after_id is None:
+            clients = self.find_by_phone(filters['phone'])
+            if prefetch_phones:
+                for client in clients:
+                    client.cache_phones(self.list_phone(client.id))
+            return clients
+        query, params = self._select_query(filters, limit, after_id, modes)
+        with self.pool.connection() as connection, connection.cursor() as cur:
+            self.statements.execute_query(cur, query, params)
+            clients = [Client(self, *client) for client in cur.fetchall()]
+            if prefetch_phones:
+                self._prefetch_phones(cur, clients)
+            return clients
+
+    def iter(self, filters: dict = None, itersize=ITER_SIZE, modes: dict = None):
+        """
+        :param filters: same as in find, all clients if not passed
+        :param itersize: number of rows fetched from the server at once
+        :param modes: same as in find
+        :return: yields clients ordered by ID, the rows are streamed through a server-side cursor,
+        the connection is held until the iteration is finished
+        """
+        query, params = self._select_query(filters or {}, modes=modes)
+        with self.pool.connection() as connection, \
+                connection.cursor(name=f'clients_iter_{next(self._cursor_ids)}') as cur:
+            cur.itersize = itersize
+            cur.execute(query, params)
+            for client in cur:
+                yield Client(self, *client)
+
+    def export(self, path: str, format: str = 'csv', since_id: int = 0, gaps: list = None):
+        """
+        :param path: output file, gzip compressed if it ends with .gz, - for stdout
+        :param format: csv or jsonl
+        :param since_id: export the clients with ID greater than this one (the last_id of the previous export)
+        :param gaps: gaps returned by the previous export
+        :return: streams the clients with their phone numbers into the file with COPY TO, the memory use does not
+        depend on the number of clients, returns {'rows': ..., 'last_id': ..., 'gaps': ...} (see export_clients)
         """
+        with self.pool.connection() as connection, connection.cursor() as cur, export.open_output(path) as output:
+            return export.export_clients(cur, output, format, since_id, gaps)
+
+    @staticmethod
+    def _select_query(filters: dict, limit=None, after_id=None, modes: dict = None):
+        """
+        :param filters: same as in find
+        :param limit: max number of clients
+        :param after_id: keyset pagination cursor
+        :param modes: same as in find
+        :return: query and its parameters, the predicates are written so that they can use the indexes
+        created by create_indexes
+        """
+        modes = modes or {}
         filter_parts = []
-        filter_by_phone = False
         for key, value in filters.items():
             if key == 'phone':
-                filter_by_phone = True
-                filter_parts += [('client_phone.phone', Phone.parse(value),)]
-            elif key in ['first_name', 'last_name', 'email']:
-                filter_parts += [(f'client.{key}', f'%{value.lower()}%',)]
-        with self.connection.cursor() as cur:
-            query = 'SELECT client.* FROM client'
-            if filter_by_phone:
-                query += ' JOIN client_phone ON client_phone.client_id = client.id'
-            query += f' WHERE {" AND ".join(["LOWER(" + v[0] + ") LIKE %s" for v in filter_parts])};'
-            cur.execute(query, tuple([v[1] for v in filter_parts]))
-            return [Client(self, *client) for client in cur.fetchall()]
+                filter_parts += [(
+                    'EXISTS (SELECT 1 FROM client_phone WHERE client_phone.client_id = client.id '
+                    'AND client_phone.phone = %s)', Phone.parse(value),
+                )]
+            elif key in SEARCH_FIELDS:
+                mode = modes.get(key, DEFAULT_SEARCH_MODE)
+                if mode == 'contains':
+                    filter_parts += [(f'client.{key} ILIKE %s', f'%{escape_like(value)}%',)]
+                elif mode == 'prefix':
+                    filter_parts += [(f'LOWER(client.{key}) LIKE %s', f'{escape_like(value.lower())}%',)]
+                elif mode == 'exact':
+                    filter_parts += [(f'LOWER(client.{key}) = %s', value.lower(),)]
+                elif mode == 'similar':
+                    filter_parts += [(f'client.{key} %% %s', value,)]
+                else:
+                    raise Exception(f'Unknown search mode {mode}')
+        if after_id is not None:
+            filter_parts += [('client.id > %s', after_id)]
+        query = 'SELECT client.* FROM client'
+        if filter_parts:
+            query += f' WHERE {" AND ".join([v[0] for v in filter_parts])}'
+        query += ' ORDER BY client.id'
+        params = [v[1] for v in filter_parts]
+        if limit is not None:
+            query += ' LIMIT %s'
+            params.append(limit)
+        return query, tuple(params)
+
+    def _prefetch_phones(self, cur, clients: list):
+        """
+        :param cur: psycopg2 cursor
+        :param clients: list of Client instances
+        :return: loads the phone numbers of all the clients with one query and caches them on the instances
+        """
+        phones = {client.id: [] for client in clients}
+        if not phones:
+            return
+        self.statements.execute(cur, 'list_phones_many', (list(phones),))
+        for phone_id, client_id, number in cur.fetchall():
+            phones[client_id].append(Phone.from_row(number, phone_id))
+        for client in clients:
+            client.cache_phones(phones[client.id])
 
     def remove(self, client_id):
         """
         :param client_id: client ID in the database
         :return: True if removed
         """
-        self.remove_phone(client_id)
-        with self.connection.cursor() as cur:
-            cur.execute('DELETE FROM client WHERE id=%s RETURNING id;', (client_id,))
-            if client_id == cur.fetchone()[0]:
-                self.connection.commit()
-                return True
-            return False
+        with self._transaction() as (cur, client_ids, _):
+            client_ids.add(client_id)
+            self.statements.execute(cur, 'delete_client_phones', (client_id,))
+            self.statements.execute(cur, 'delete_client', (client_id,))
+            return client_id == cur.fetchone()[0]
+
+    def remove_many(self, client_ids: list):
+        """
+        :param client_ids: list of client IDs in the database
+        :return: removes the clients and all their phone numbers in one transaction, returns the number of removed clients
+        """
+        client_ids = list(client_ids)
+        if not client_ids:
+            return 0
+        with self._transaction() as (cur, changed_client_ids, _):
+            changed_client_ids.update(client_ids)
+            self.statements.execute(cur, 'delete_phones_many', (client_ids,))
+            self.statements.execute(cur, 'delete_clients_many', (client_ids,))
+            return cur.rowcount
 
     def remove_phone(self, client_id, phone: Phone = None):
         """
@@ -242,16 +693,19 @@ class Clients:
         :param phone: phone (if not passed, all the client's phone numbers will be deleted)
         :return: True if removed
         """
-        query = 'DELETE FROM client_phone WHERE client_id = %s'
-        if phone:
-            query += ' AND id=%s'
-        with self.connection.cursor() as cur:
-            cur.execute(f'{query} RETURNING id;', (client_id, phone.id,) if phone else (client_id, ))
-            self.connection.commit()
+        with self._transaction() as (cur, client_ids, numbers):
+            client_ids.add(client_id)
+            if phone:
+                numbers.add(phone.number)
+                self.statements.execute(cur, 'delete_phone', (client_id, phone.id,))
+            else:
+                self.statements.execute(cur, 'delete_client_phones', (client_id,))
             return True
 
 
 class Client:
+    __slots__ = ('clients', '_id', '_first_name', '_last_name', '_email', '_phones')
+
     def __init__(self, parent: Clients, client_id: int, first_name: str, last_name: str, email: str):
         """
         :param parent: instance of Clients
@@ -265,6 +719,7 @@ class Client:
         self._first_name = first_name
         self._last_name = last_name
         self._email = email
+        self._phones = None
 
     def __str__(self):
         return f'{self.first_name} {self.last_name} [{self.email}]'
@@ -306,14 +761,22 @@ class Client:
     @property
     def phones(self):
         """
-        :return: list of client`s phones numbers
+        :return: list of client`s phones numbers, cached until the numbers are changed through this instance
         """
         if not self._id:
             raise Exception('Client not exist')
-        phone_list = self.clients.list_phone(self._id)
+        if self._phones is None:
+            self.cache_phones(self.clients.list_phone(self._id))
+        return list(self._phones)
+
+    def cache_phones(self, phone_list: list):
+        """
+        :param phone_list: list of the client`s Phone instances
+        :return: caches the phone numbers on the instance, returns None
+        """
         for phone in phone_list:
             phone.client = self
-        return phone_list
+        self._phones = phone_list
 
     def add_phone(self, phone: str):
         """
@@ -322,7 +785,9 @@ class Client:
         """
         if not self._id:
             raise Exception('Client not exist')
+        self._phones = None
         if phone := self.clients.add_phone(self._id, phone):
+            phone.client = self
             return phone
 
     def change_phone(self, old: Phone, new: str):
@@ -334,6 +799,7 @@ class Client:
         if not self._id:
             raise Exception('Client not exist')
         new = Phone.parse(new)
+        self._phones = None
         if self.clients.change(self._id, 'phone', old.id, new):
             return True
 
@@ -344,6 +810,7 @@ class Client:
         """
         if not self._id:
             raise Exception('Client not exist')
+        self._phones = None
         return self.clients.remove_phone(self._id, phone)
 
     def remove(self):
@@ -355,6 +822,7 @@ class Client:
             self._first_name = None
             self._last_name = None
             self._email = None
+            self._phones = None
             return True
 
 
@@ -396,8 +864,15 @@ class App:
                     'user': user,
                     'password': password
                 }
-        if not self.clients.check_schema():
+        diff = self.clients.schema_diff(use_cache=True)
+        if diff.get('missing') or diff.get('mistyped'):
             print('В базе данных нет необходимых для работы таблиц или их структура не подходит.')
+            for table, column, data_type in diff.get('missing', []):
+                print(f'- нет столбца {table}.{column} ({data_type})')
+            for table, column, data_type in diff.get('extra', []):
+                print(f'- лишний столбец {table}.{column} ({data_type})')
+            for table, column, expected, actual in diff.get('mistyped', []):
+                print(f'- столбец {table}.{column} имеет тип {actual} вместо {expected}')
             if input('Создать таблицы? (да/нет): ').lower().startswith('д'):
                 self.clients.create_schema()
             else:
@@ -446,32 +921,33 @@ class App:
             if user_choice == 0:
                 return self.main_menu()
             if user_choice == 9:
-                client_list = self.clients.list() if not len(filters) else self.clients.find(filters)
-                return self.client_list_menu(client_list)
+                return self.client_list_menu(filters)
 
-    def client_list_menu(self, client_list: dict):
+    def client_list_menu(self, filters: dict):
         """
-        :param client_list: list of clients available for selection
+        :param filters: search criteria (all clients if empty), the clients are loaded page by page
         :return: returns to the menu of the selected client
         """
         print()
-        client_count = len(client_list)
-        if not client_count:
-            print('Клиентов не найдено')
-            return self.main_menu()
-        client_ids = list(range(1, client_count + 1))
-        page_count = client_count // PAGE_SIZE + (1 if client_count % PAGE_SIZE else 0)
+        after_ids = [None]
         page = 1
         while True:
-            i = (page - 1) * PAGE_SIZE
-            print(f'Страница {page}/{page_count}:')
+            client_list = self.clients.find(filters, limit=PAGE_SIZE + 1, after_id=after_ids[page - 1])
+            has_next_page = len(client_list) > PAGE_SIZE
+            client_list = client_list[:PAGE_SIZE]
+            if not client_list and page == 1:
+                print('Клиентов не найдено')
+                return self.main_menu()
+            first_id = (page - 1) * PAGE_SIZE + 1
+            client_ids = list(range(first_id, first_id + len(client_list)))
+            print(f'Страница {page}:')
             print(*[
                 f'{client_id}. {client.first_name} {client.last_name} [{client.email}]'
-                for client_id, client in zip(client_ids[i:i + PAGE_SIZE], client_list[i:i + PAGE_SIZE])
+                for client_id, client in zip(client_ids, client_list)
             ], sep='\n')
             if page > 1:
                 print('<. Предыдущая страница')
-            if page < page_count:
+            if has_next_page:
                 print('>. Следующая страница')
             print('0. Главное меню')
             user_choice = input('введите номер клиента для выбора: ')
@@ -480,11 +956,12 @@ class App:
                     page -= 1
                 continue
             elif user_choice == '>':
-                if page < page_count:
+                if has_next_page:
+                    after_ids[page:] = [client_list[-1].id]
                     page += 1
                 continue
             elif int(user_choice) in client_ids:
-                client = client_list[int(user_choice) - 1]
+                client = client_list[int(user_choice) - first_id]
                 return self.client_menu(client)
             return self.main_menu()
 
@@ -613,5 +1090,16 @@ class App:
 
 
 if __name__ == '__main__':
-    app = App()
+    options = {}
+    if os.getenv('SQL_METRICS'):
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        import sqlmetrics
+        from sqlmetrics.cursor import metrics_cursor_factory
+        if os.getenv('SLOW_QUERY_MS'):
+            sqlmetrics.REGISTRY.slow_threshold = float(os.getenv('SLOW_QUERY_MS')) / 1000
+        options['cursor_factory'] = metrics_cursor_factory()
+        atexit.register(lambda: print(
+            sqlmetrics.REGISTRY.prometheus() if os.getenv('SQL_METRICS') == 'prometheus' else sqlmetrics.REGISTRY.dump()
+        ))
+    app = App(**options)
     app.main_menu()
@@ -0,0 +1,146 @@
+import contextlib
+import threading
+import time
+import psycopg2
+import psycopg2.pool
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool(psycopg2.pool.ThreadedConnectionPool):
+    def __init__(self, min_size: int = 1, max_size: int = 10, timeout: float = None,
+                 health_check_interval: float = 30, max_idle: int = None, **kwargs):
+        """
+        :param min_size: number of connections opened on start
+        :param max_size: max number of connections, callers wait for a free connection when all are in use
+        :param timeout: max seconds to wait for a free connection (None - wait forever)
+        :param health_check_interval: a connection idle longer than this (in seconds) is checked
+        with SELECT 1 on checkout, 0 - check on every checkout
+        :param max_idle: max number of idle connections kept open (max_size by default)
+        :param kwargs: database connection parameters (psycopg2.connect)
+        """
+        self.timeout = timeout
+        self.max_idle = max_size if max_idle is None else max_idle
+        self.health_check_interval = health_check_interval
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._stats_lock = threading.Lock()
+        self._last_used = {}
+        self.created = 0
+        self.discarded = 0
+        self.checkouts = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        super().__init__(min_size, max_size, **kwargs)
+
+    def _connect(self, key=None):
+        connection = super()._connect(key)
+        with self._stats_lock:
+            self.created += 1
+        return connection
+
+    def _putconn(self, conn, key=None, close=False):
+        # psycopg2 closes every returned connection above minconn, keep up to max_idle of them instead
+        minconn, self.minconn = self.minconn, max(self.minconn, self.max_idle)
+        try:
+            super()._putconn(conn, key, close)
+        finally:
+            self.minconn = minconn
+
+    def is_healthy(self, connection):
+        """
+        :param connection: psycopg2 connection
+        :return: True if the connection is open and the server responds
+        """
+        if connection.closed:
+            return False
+        last_used = self._last_used.get(id(connection))
+        if last_used is not None and time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with connection.cursor() as cur:
+                cur.execute('SELECT 1;')
+            connection.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def checkout(self):
+        """
+        :return: a healthy connection from the pool, broken connections are closed and replaced
+        """
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f'No free connection in {self.timeout} s')
+        waited = time.monotonic() - started
+        with self._stats_lock:
+            self.checkouts += 1
+            self.wait_time += waited
+            self.max_wait_time = max(self.max_wait_time, waited)
+        try:
+            while True:
+                connection = self.getconn()
+                if self.is_healthy(connection):
+                    return connection
+                self._last_used.pop(id(connection), None)
+                self.putconn(connection, close=True)
+                with self._stats_lock:
+                    self.discarded += 1
+        except Exception:
+            self._slots.release()
+            raise
+
+    def checkin(self, connection):
+        """
+        :param connection: connection returned by checkout
+        :return: returns the connection to the pool
+        """
+        try:
+            if connection.closed:
+                self._last_used.pop(id(connection), None)
+            else:
+                self._last_used[id(connection)] = time.monotonic()
+            self.putconn(connection, close=bool(connection.closed))
+        finally:
+            self._slots.release()
+
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        :return: context manager with a connection checked out for one transaction,
+        commits on success and rolls back on error
+        """
+        connection = self.checkout()
+        try:
+            yield connection
+            connection.commit()
+        except BaseException:
+            if not connection.closed:
+                connection.rollback()
+            raise
+        finally:
+            self.checkin(connection)
+
+    def dedicated_connection(self):
+        """
+        :return: a new connection with the pool connection parameters that is not managed by the pool
+        """
+        return psycopg2.connect(*self._args, **self._kwargs)
+
+    def stats(self):
+        """
+        :return: pool statistics
+        """
+        with self._stats_lock:
+            return {
+                'created': self.created,
+                'discarded': self.discarded,
+                'in_use': len(self._used),
+                'idle': len(self._pool),
+                'max_size': self.maxconn,
+                'checkouts': self.checkouts,
+                'wait_time': self.wait_time,
+                'avg_wait_time': self.wait_time / self.checkouts if self.checkouts else 0.0,
+                'max_wait_time': self.max_wait_time,
+            }
@@ -0,0 +1,115 @@
+import collections
+import hashlib
+import re
+import threading
+import psycopg2.extensions
+
+VARIANTS_CACHE_SIZE = 64
+
+PLACEHOLDER = re.compile(r'%([s%])')
+
+
+class PreparingConnection(psycopg2.extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+        self.prepared_variants = collections.OrderedDict()
+
+
+def positional(query: str):
+    """
+    :param query: query with psycopg2 placeholders (%s)
+    :return: the query with PostgreSQL positional placeholders ($1, $2, ...) and the number of parameters
+    """
+    count = 0
+
+    def replace(match):
+        nonlocal count
+        if match.group(1) == '%':
+            return '%'
+        count += 1
+        return f'${count}'
+    return PLACEHOLDER.sub(replace, query), count
+
+
+class StatementRegistry:
+    def __init__(self, statements: dict, variants_cache_size=VARIANTS_CACHE_SIZE):
+        """
+        :param statements: fixed statements like {name: query with psycopg2 placeholders}
+        :param variants_cache_size: max number of dynamic statements kept prepared per connection
+        (least recently used ones are deallocated)
+        """
+        self.statements = {name: positional(query) for name, query in statements.items()}
+        self.plain = statements
+        self.variants_cache_size = variants_cache_size
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _count(self, hit: bool, evictions: int = 0):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.evictions += evictions
+
+    @staticmethod
+    def _execute_prepared(cur, name: str, params: tuple, query: str):
+        if hasattr(cur, 'reported_statement'):
+            # metrics cursors (sqlmetrics) report the query instead of EXECUTE name
+            cur.reported_statement = query
+        if params:
+            cur.execute(f'EXECUTE {name} ({", ".join(["%s"] * len(params))});', params)
+        else:
+            cur.execute(f'EXECUTE {name};')
+
+    def execute(self, cur, name: str, params: tuple = ()):
+        """
+        :param cur: psycopg2 cursor
+        :param name: name of a fixed statement
+        :param params: statement parameters
+        :return: executes the statement, it is prepared on the first use on each connection
+        """
+        prepared = getattr(cur.connection, 'prepared', None)
+        if prepared is None:
+            return cur.execute(self.plain[name], params)
+        if name in prepared:
+            self._count(True)
+        else:
+            cur.execute(f'PREPARE {name} AS {self.statements[name][0]};')
+            prepared.add(name)
+            self._count(False)
+        self._execute_prepared(cur, name, params, self.plain[name])
+
+    def execute_query(self, cur, query: str, params: tuple = ()):
+        """
+        :param cur: psycopg2 cursor
+        :param query: dynamic query with psycopg2 placeholders
+        :param params: query parameters
+        :return: executes the query, the prepared variants are kept in an LRU cache per connection
+        """
+        variants = getattr(cur.connection, 'prepared_variants', None)
+        if variants is None:
+            return cur.execute(query, params)
+        name = 'q_' + hashlib.md5(query.encode()).hexdigest()[:16]
+        if name in variants:
+            variants.move_to_end(name)
+            self._count(True)
+        else:
+            evicted = 0
+            while len(variants) >= self.variants_cache_size:
+                cur.execute(f'DEALLOCATE {variants.popitem(last=False)[0]};')
+                evicted += 1
+            cur.execute(f'PREPARE {name} AS {positional(query)[0]};')
+            variants[name] = query
+            self._count(False, evicted)
+        self._execute_prepared(cur, name, params, query)
+
+    def stats(self):
+        """
+        :return: prepared statement cache statistics
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
@@ -0,0 +1,32 @@
+import os
+import psycopg2.extensions
+import pytest
+from bench_indexes import CASES, TRIGRAM_INDEX_CASES, prepare_data, search_queries, seq_scans, measure
+from main import Clients
+
+# the schema of this database is recreated by the tests
+TEST_DSN = os.getenv('CUSTOMERSDB_TEST_DSN')
+TEST_CLIENT_COUNT = 20000
+
+
+@pytest.fixture(scope='module')
+def clients():
+    if not TEST_DSN:
+        pytest.skip('CUSTOMERSDB_TEST_DSN is not set')
+    params = psycopg2.extensions.parse_dsn(TEST_DSN)
+    clients = Clients(database=params.get('dbname'), user=params.get('user'), password=params.get('password'),
+                      host=params.get('host'), port=params.get('port'))
+    prepare_data(clients, TEST_CLIENT_COUNT)
+    clients.trigram = clients.create_indexes()
+    yield clients
+    clients.close()
+
+
+@pytest.mark.parametrize('case', list(CASES))
+def test_search_does_not_scan_tables(clients, case):
+    if case in TRIGRAM_INDEX_CASES and not clients.trigram:
+        pytest.skip('the pg_trgm extension is not available')
+    value, query, params = search_queries(clients, TEST_CLIENT_COUNT)[case]
+    with clients.pool.connection() as connection, connection.cursor() as cur:
+        scans, _ = measure(cur, query, params, 1)
+    assert not seq_scans(scans), f'{case} {value!r}: {", ".join(scans)}'
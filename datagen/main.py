@@ -0,0 +1,424 @@
+import abc
+import argparse
+import datetime
+import io
+import json
+import math
+import os
+import random
+import time
+import psycopg2
+
+DEFAULT_ROWS = 1000
+DEFAULT_SEED = 42
+SALES_START = datetime.datetime(2018, 1, 1)
+SALES_DAYS = 5 * 365
+WORDS = [
+    'love', 'night', 'summer', 'fire', 'city', 'dream', 'black', 'water', 'stories', 'light', 'heart', 'road',
+    'python', 'data', 'guide', 'art', 'modern', 'deep', 'learning', 'systems', 'design', 'practice',
+    'море', 'небо', 'лето', 'город', 'ночь', 'дорога', 'сердце', 'звезда', 'ветер', 'песня', 'мечта', 'рай',
+]
+
+
+class ZipfSampler:
+    def __init__(self, n: int, exponent: float, rng: random.Random):
+        """
+        :param n: number of elements
+        :param exponent: skew, probability of the rank k is proportional to 1 / k ** exponent
+        :param rng: random generator
+        rejection-inversion sampling (W. Hörmann, G. Derflinger), constant time and memory for any n
+        """
+        self.n = n
+        self.exponent = exponent
+        self.rng = rng
+        self.h_integral_x1 = self.h_integral(1.5) - 1.0
+        self.h_integral_n = self.h_integral(n + 0.5)
+        self.threshold = 2.0 - self.h_integral_inverse(self.h_integral(2.5) - self.h(2.0))
+
+    def h(self, x: float):
+        return math.exp(-self.exponent * math.log(x))
+
+    def h_integral(self, x: float):
+        log_x = math.log(x)
+        t = (1.0 - self.exponent) * log_x
+        return (math.expm1(t) / t if abs(t) > 1e-8 else 1.0 + t * 0.5 * (1.0 + t / 3.0 * (1.0 + 0.25 * t))) * log_x
+
+    def h_integral_inverse(self, x: float):
+        t = max(x * (1.0 - self.exponent), -1.0)
+        return math.exp((math.log1p(t) / t if abs(t) > 1e-8 else 1.0 - t * (0.5 - t * (1.0 / 3.0 - 0.25 * t))) * x)
+
+    def sample(self):
+        """
+        :return: rank from 1 to n, 1 is the most frequent
+        """
+        while True:
+            u = self.h_integral_n + self.rng.random() * (self.h_integral_x1 - self.h_integral_n)
+            x = self.h_integral_inverse(u)
+            k = min(max(int(x + 0.5), 1), self.n)
+            if k - x <= self.threshold or u >= self.h_integral(k + 0.5) - self.h(k):
+                return k
+
+
+class Permutation:
+    def __init__(self, n: int, rng: random.Random):
+        """
+        :param n: number of elements
+        :param rng: random generator
+        maps ranks to IDs with (a * rank + b) mod n, so the popular IDs are spread over the table without storing
+        the permutation
+        """
+        self.n = n
+        self.a = rng.randrange(1, n) if n > 1 else 1
+        while math.gcd(self.a, n) != 1:
+            self.a = rng.randrange(1, n)
+        self.b = rng.randrange(n)
+
+    def __call__(self, rank: int):
+        """
+        :param rank: rank from 1 to n
+        :return: ID from 1 to n
+        """
+        return (self.a * (rank - 1) + self.b) % self.n + 1
+
+
+class ZipfIds:
+    def __init__(self, n: int, exponent: float, rng: random.Random):
+        """
+        :param n: number of IDs
+        :param exponent: same as in ZipfSampler
+        :param rng: random generator
+        """
+        self.sampler = ZipfSampler(n, exponent, rng)
+        self.permutation = Permutation(n, rng)
+
+    def __call__(self):
+        """
+        :return: Zipf-distributed ID from 1 to n
+        """
+        return self.permutation(self.sampler.sample())
+
+    def distinct(self, count: int):
+        """
+        :param count: number of IDs (not greater than n)
+        :return: sorted list of distinct IDs
+        """
+        ids = set()
+        while len(ids) < min(count, self.sampler.n):
+            ids.add(self())
+        return sorted(ids)
+
+
+def title(rng: random.Random, max_words: int = 3):
+    """
+    :param rng: random generator
+    :param max_words: max number of words
+    :return: random title
+    """
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, max_words))).capitalize()
+
+
+class Dataset(abc.ABC):
+    def __init__(self, rows: int, seed: int = DEFAULT_SEED):
+        """
+        :param rows: number of rows in the largest table
+        :param seed: random seed, the same seed and rows produce the same data
+        """
+        self.rows = rows
+        self.seed = seed
+
+    def rng(self, table: str):
+        """
+        :param table: table name
+        :return: random generator of the table, so each table does not depend on the amount of data before it
+        """
+        return random.Random(f'{self.seed}:{table}')
+
+    @abc.abstractmethod
+    def tables(self):
+        """
+        :return: list of (table name, columns, function returning an iterator of rows) in the load order
+        """
+
+
+class MusicDataset(Dataset):
+    """
+    Tables of scheme_init.sql, rows is the number of tracks
+    """
+    def __init__(self, rows: int, seed: int = DEFAULT_SEED):
+        super().__init__(rows, seed)
+        self.genres = max(6, int(rows ** 0.25))
+        self.artists = max(10, rows // 50)
+        self.albums = max(10, rows // 10)
+        self.collections = max(8, rows // 200)
+
+    def tables(self):
+        return [
+            ('genres', ['genre_id', 'genre_title'], self.genre_rows),
+            ('artists', ['artist_id', 'alias'], self.artist_rows),
+            ('albums', ['album_id', 'album_title', 'album_year'], self.album_rows),
+            ('collections', ['collection_id', 'collection_title', 'collection_year'], self.collection_rows),
+            ('tracks', ['track_id', 'track_title', 'duration', 'album_id'], self.track_rows),
+            ('artist_genres', ['artist_id', 'genre_id'], self.artist_genre_rows),
+            ('album_artists', ['album_id', 'artist_id'], self.album_artist_rows),
+            ('collection_tracks', ['collection_id', 'track_id'], self.collection_track_rows),
+        ]
+
+    def genre_rows(self):
+        rng = self.rng('genres')
+        for genre_id in range(1, self.genres + 1):
+            yield genre_id, f'{title(rng, 2)} {genre_id}'
+
+    def artist_rows(self):
+        rng = self.rng('artists')
+        for artist_id in range(1, self.artists + 1):
+            yield artist_id, title(rng, 2)
+
+    def album_rows(self):
+        rng = self.rng('albums')
+        for album_id in range(1, self.albums + 1):
+            yield album_id, title(rng), max(1960, 2022 - int(rng.expovariate(1 / 8)))
+
+    def collection_rows(self):
+        rng = self.rng('collections')
+        for collection_id in range(1, self.collections + 1):
+            yield collection_id, title(rng), rng.randint(2000, 2022)
+
+    def track_rows(self):
+        rng = self.rng('tracks')
+        albums = ZipfIds(self.albums, 0.8, rng)
+        for track_id in range(1, self.rows + 1):
+            yield track_id, title(rng), max(30, int(rng.lognormvariate(math.log(210), 0.3))), albums()
+
+    def artist_genre_rows(self):
+        rng = self.rng('artist_genres')
+        genres = ZipfIds(self.genres, 1.1, rng)
+        for artist_id in range(1, self.artists + 1):
+            for genre_id in genres.distinct(rng.choices([1, 2, 3], [6, 3, 1])[0]):
+                yield artist_id, genre_id
+
+    def album_artist_rows(self):
+        rng = self.rng('album_artists')
+        artists = ZipfIds(self.artists, 1.0, rng)
+        for album_id in range(1, self.albums + 1):
+            for artist_id in artists.distinct(2 if rng.random() < 0.1 else 1):
+                yield album_id, artist_id
+
+    def collection_track_rows(self):
+        rng = self.rng('collection_tracks')
+        tracks = ZipfIds(self.rows, 1.0, rng)
+        for collection_id in range(1, self.collections + 1):
+            for track_id in tracks.distinct(rng.randint(10, 30)):
+                yield collection_id, track_id
+
+
+class BookstoreDataset(Dataset):
+    """
+    Tables of bookstore/model.py, rows is the number of sales
+    """
+    def __init__(self, rows: int, seed: int = DEFAULT_SEED):
+        super().__init__(rows, seed)
+        self.publishers = max(4, rows // 20000)
+        self.shops = max(3, rows // 2000)
+        self.books = max(6, rows // 200)
+        self.book_prices = []
+        self.stock_books = []
+
+    def tables(self):
+        return [
+            ('publisher', ['id', 'name'], self.publisher_rows),
+            ('shop', ['id', 'name'], self.shop_rows),
+            ('book', ['id', 'title', 'id_publisher'], self.book_rows),
+            ('stock', ['id', 'id_book', 'id_shop', 'count'], self.stock_rows),
+            ('sale', ['id', 'price', 'date_sale', 'id_stock', 'count'], self.sale_rows),
+        ]
+
+    def publisher_rows(self):
+        rng = self.rng('publisher')
+        for publisher_id in range(1, self.publishers + 1):
+            yield publisher_id, f'{title(rng, 2)} press {publisher_id}'
+
+    def shop_rows(self):
+        rng = self.rng('shop')
+        for shop_id in range(1, self.shops + 1):
+            yield shop_id, f'{title(rng, 2)} {shop_id}'
+
+    def book_rows(self):
+        rng = self.rng('book')
+        publishers = ZipfIds(self.publishers, 1.0, rng)
+        self.book_prices = [0.0]
+        for book_id in range(1, self.books + 1):
+            self.book_prices.append(round(rng.lognormvariate(math.log(20), 0.5), 2))
+            yield book_id, title(rng, 4), publishers()
+
+    def stock_rows(self):
+        rng = self.rng('stock')
+        shops = ZipfIds(self.shops, 1.0, rng)
+        self.stock_books = [0]
+        for book_id in range(1, self.books + 1):
+            for shop_id in shops.distinct(1 + int(rng.expovariate(0.7))):
+                self.stock_books.append(book_id)
+                yield len(self.stock_books) - 1, book_id, shop_id, rng.randint(0, 1000)
+
+    def sale_rows(self):
+        """
+        sales are skewed by stock row and ordered by date like the sales of a real shop
+        """
+        if not self.stock_books:
+            for _ in self.book_rows():
+                pass
+            for _ in self.stock_rows():
+                pass
+        rng = self.rng('sale')
+        stock = ZipfIds(len(self.stock_books) - 1, 1.0, rng)
+        step = SALES_DAYS * 24 * 60 * 60 / self.rows
+        for sale_id in range(1, self.rows + 1):
+            stock_id = stock()
+            date_sale = SALES_START + datetime.timedelta(seconds=(sale_id - 1 + rng.random()) * step)
+            yield sale_id, self.book_prices[self.stock_books[stock_id]], date_sale.isoformat(timespec='milliseconds'), \
+                stock_id, 1 + int(rng.expovariate(1.0))
+
+
+DATASETS = {'music': MusicDataset, 'bookstore': BookstoreDataset}
+
+
+def copy_text(value):
+    """
+    :param value: python value
+    :return: value encoded for the PostgreSQL COPY text format
+    """
+    if value is None:
+        return '\\N'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_lines(rows):
+    """
+    :param rows: iterator of row tuples
+    :return: yields the rows as lines of the COPY text format
+    """
+    for row in rows:
+        yield '\t'.join(copy_text(value) for value in row) + '\n'
+
+
+class LineReader(io.TextIOBase):
+    def __init__(self, lines):
+        """
+        :param lines: iterator of lines, read by copy_expert as a file without keeping the whole table in memory
+        """
+        self.lines = lines
+        self.buffer = ''
+        self.count = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        chunks, length = [self.buffer], len(self.buffer)
+        while size < 0 or length < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            chunks.append(line)
+            length += len(line)
+            self.count += 1
+        data = ''.join(chunks)
+        if size < 0:
+            self.buffer = ''
+            return data
+        self.buffer = data[size:]
+        return data[:size]
+
+    def readline(self, size=-1):
+        if self.buffer:
+            line, self.buffer = self.buffer, ''
+            return line
+        line = next(self.lines, '')
+        self.count += bool(line)
+        return line
+
+
+def report(table: str, count: int, started: float):
+    elapsed = time.perf_counter() - started
+    print(f'{table}: {count} строк за {elapsed:.2f} с ({count / elapsed if elapsed else 0:.0f} строк/с)')
+
+
+def write_copy_files(dataset: Dataset, directory: str):
+    """
+    :param dataset: dataset
+    :param directory: output directory
+    :return: writes a <table>.copy file per table, it is loaded with \\copy <table> (<columns>) FROM '<table>.copy'
+    """
+    os.makedirs(directory, exist_ok=True)
+    for table, columns, rows in dataset.tables():
+        started, count = time.perf_counter(), 0
+        with open(os.path.join(directory, f'{table}.copy'), 'w', encoding='utf-8', newline='\n') as file:
+            for line in copy_lines(rows()):
+                file.write(line)
+                count += 1
+        report(table, count, started)
+
+
+def write_fixture(dataset: Dataset, directory: str):
+    """
+    :param dataset: dataset
+    :param directory: output directory
+    :return: writes <dataset>.jsonl in the fixture format of bookstore/main.py (one item per line)
+    """
+    os.makedirs(directory, exist_ok=True)
+    name = [key for key, value in DATASETS.items() if isinstance(dataset, value)][0]
+    with open(os.path.join(directory, f'{name}.jsonl'), 'w', encoding='utf-8', newline='\n') as file:
+        for table, columns, rows in dataset.tables():
+            started, count = time.perf_counter(), 0
+            for pk, *values in rows():
+                file.write(json.dumps({'model': table, 'pk': pk, 'fields': dict(zip(columns[1:], values))},
+                                      ensure_ascii=False) + '\n')
+                count += 1
+            report(table, count, started)
+
+
+def load(dataset: Dataset, dsn: str, truncate: bool = False):
+    """
+    :param dataset: dataset
+    :param dsn: PostgreSQL connection string, the tables should already exist
+    :param truncate: remove the existing rows of the tables first
+    :return: streams the rows into the tables with COPY FROM STDIN (one transaction per table)
+    and moves the ID sequences past the loaded IDs
+    """
+    tables = dataset.tables()
+    with psycopg2.connect(dsn) as connection, connection.cursor() as cur:
+        if truncate:
+            cur.execute(f'TRUNCATE {", ".join(table for table, _, _ in tables)} CASCADE;')
+            connection.commit()
+        for table, columns, rows in tables:
+            started = time.perf_counter()
+            reader = LineReader(copy_lines(rows()))
+            cur.copy_expert(f'COPY {table} ({", ".join(columns)}) FROM STDIN', reader)
+            cur.execute(f'''
+                SELECT setval(sequence, (SELECT COALESCE(MAX({columns[0]}), 0) + 1 FROM {table}), false)
+                FROM pg_get_serial_sequence(%s, %s) sequence WHERE sequence IS NOT NULL;
+            ''', (table, columns[0]))
+            connection.commit()
+            report(table, reader.count, started)
+    connection.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generates test data for scheme_init.sql or bookstore/model.py')
+    parser.add_argument('dataset', choices=list(DATASETS))
+    parser.add_argument('--rows', type=int, default=DEFAULT_ROWS,
+                        help='number of rows in the largest table (tracks or sale), the other tables are scaled')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--output', help='directory for the generated files')
+    parser.add_argument('--format', choices=['copy', 'jsonl'], default='copy',
+                        help='copy - <table>.copy files, jsonl - fixture for bookstore/main.py --fixture')
+    parser.add_argument('--dsn', help='load into the database instead of writing files')
+    parser.add_argument('--truncate', action='store_true', help='remove the existing rows before loading')
+    args = parser.parse_args()
+
+    data = DATASETS[args.dataset](args.rows, args.seed)
+    if args.dsn:
+        load(data, args.dsn, args.truncate)
+    elif args.output:
+        (write_fixture if args.format == 'jsonl' else write_copy_files)(data, args.output)
+    else:
+        parser.error('--output or --dsn is required')
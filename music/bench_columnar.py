@@ -0,0 +1,123 @@
+import argparse
+import time
+import psycopg2
+from columnar import Catalogue
+from search import DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+
+RUNS = 20
+# name -> (query of advanced_selections.sql selecting each entity once like the Catalogue does,
+# Catalogue method, function of the artist alias returning the method parameters)
+QUERIES = {
+    'genre artist counts': (
+        'SELECT genre_title, artist_count FROM genre_artist_counts ORDER BY artist_count DESC',
+        'genre_artist_counts', lambda alias: ()
+    ),
+    'tracks of 2019-2020': (
+        'SELECT COALESCE(sum(track_count), 0) FROM album_stats WHERE album_year IN (2019, 2020)',
+        'album_years_track_count', lambda alias: ([2019, 2020],)
+    ),
+    'album avg duration': (
+        'SELECT album_title, avg_duration FROM album_stats WHERE track_count > 0 ORDER BY album_title',
+        'album_average_durations', lambda alias: ()
+    ),
+    'artists without 2020': ('''
+        SELECT ar.alias FROM artists ar
+        WHERE NOT EXISTS (
+            SELECT 1 FROM album_artists aa JOIN albums a ON aa.album_id = a.album_id
+            WHERE aa.artist_id = ar.artist_id AND a.album_year = 2020
+        )
+    ''', 'artists_without_albums', lambda alias: (2020,)),
+    'artist collections': ('''
+        SELECT c.collection_title FROM collections c
+        WHERE EXISTS (
+            SELECT 1 FROM collection_tracks ct
+            JOIN tracks t ON t.track_id = ct.track_id
+            JOIN album_artists aa ON aa.album_id = t.album_id
+            JOIN artists a ON a.artist_id = aa.artist_id
+            WHERE ct.collection_id = c.collection_id AND a.alias = %(alias)s
+        )
+    ''', 'artist_collections', lambda alias: (alias,)),
+    'multi-genre albums': ('''
+        SELECT albums.album_title FROM albums
+        WHERE albums.album_id IN (
+            SELECT aa.album_id FROM album_artists aa
+            JOIN artist_genres ag ON ag.artist_id = aa.artist_id
+            GROUP BY aa.album_id, aa.artist_id
+            HAVING COUNT(ag.genre_id) > 1
+        )
+    ''', 'multi_genre_artist_albums', lambda alias: ()),
+    'tracks w/o collections': ('''
+        SELECT t.track_title FROM tracks t
+        WHERE NOT EXISTS (SELECT 1 FROM collection_tracks ct WHERE ct.track_id = t.track_id)
+    ''', 'tracks_without_collections', lambda alias: ()),
+    'shortest track artists': ('''
+        SELECT a.alias FROM artists a
+        WHERE a.artist_id IN (
+            SELECT aa.artist_id FROM tracks t JOIN album_artists aa ON aa.album_id = t.album_id
+            WHERE t.duration = (SELECT MIN(duration) FROM tracks)
+        )
+    ''', 'shortest_track_artists', lambda alias: ()),
+    'fewest track albums': ('''
+        SELECT album_title FROM album_stats
+        WHERE track_count = (SELECT min(track_count) FROM album_stats WHERE track_count > 0)
+    ''', 'fewest_track_albums', lambda alias: ()),
+}
+
+
+def measure(function, runs: int):
+    """
+    :param function: function without parameters
+    :param runs: number of calls
+    :return: (average milliseconds, result of the last call)
+    """
+    started = time.perf_counter()
+    for _ in range(runs):
+        result = function()
+    return (time.perf_counter() - started) * 1000 / runs, result
+
+
+def normalize(result):
+    """
+    :return: the result comparable regardless of the row order and of the numeric types
+    """
+    if not isinstance(result, list):
+        return int(result)
+    return sorted(
+        tuple(round(float(value), 6) if not isinstance(value, str) else value for value in row)
+        if isinstance(row, tuple) else row
+        for row in result
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares the Catalogue queries with the SQL queries')
+    parser.add_argument('--runs', type=int, default=RUNS)
+    parser.add_argument('--alias', help='artist of the collections query (the first artist by default)')
+    args = parser.parse_args()
+
+    connection = psycopg2.connect(database=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT)
+    started = time.perf_counter()
+    catalogue = Catalogue(connection)
+    print(f'Загрузка: {time.perf_counter() - started:.2f} с, треков: {len(catalogue.columns["tracks"]["track_id"])}')
+    elapsed, _ = measure(catalogue.refresh, 1)
+    print(f'Обновление без изменений: {elapsed:.1f} мс')
+    elapsed, _ = measure(lambda: catalogue.refresh(use_counters=False), 1)
+    print(f'Обновление без изменений (с проверкой таблиц): {elapsed:.1f} мс')
+    alias = args.alias or catalogue.columns['artists']['alias'][0]
+
+    print(f'{"query":<24} {"sql, ms":>9} {"numpy, ms":>10} {"speedup":>8} {"rows":>8}  match')
+    with connection.cursor() as cur:
+        for name, (query, method, params) in QUERIES.items():
+            scalar = not isinstance(getattr(catalogue, method)(*params(alias)), list)
+
+            def sql():
+                cur.execute(query, {'alias': alias})
+                rows = cur.fetchall()
+                return rows[0][0] if scalar else [row if len(row) > 1 else row[0] for row in rows]
+
+            sql_elapsed, sql_result = measure(sql, args.runs)
+            numpy_elapsed, numpy_result = measure(lambda: getattr(catalogue, method)(*params(alias)), args.runs)
+            rows = len(numpy_result) if isinstance(numpy_result, list) else 1
+            print(f'{name:<24} {sql_elapsed:>9.2f} {numpy_elapsed:>10.3f} {sql_elapsed / numpy_elapsed:>8.0f} '
+                  f'{rows:>8}  {"да" if normalize(sql_result) == normalize(numpy_result) else "НЕТ"}')
+    connection.close()
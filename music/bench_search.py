@@ -0,0 +1,51 @@
+import argparse
+import time
+import psycopg2
+from search import search, DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+
+RUNS = 20
+WORDS = ['мой', 'my', 'love', 'море', 'night', 'звезда']
+COUNT_QUERIES = {
+    'fts': 'SELECT count(*) FROM tracks WHERE track_tsv @@ search_query(%s)',
+    'like': "SELECT count(*) FROM tracks WHERE LOWER(track_title) LIKE '%%' || LOWER(%s) || '%%'",
+}
+
+
+def measure(function, runs: int):
+    """
+    :param function: function without parameters
+    :param runs: number of calls
+    :return: (average milliseconds, result of the last call)
+    """
+    started = time.perf_counter()
+    for _ in range(runs):
+        result = function()
+    return (time.perf_counter() - started) * 1000 / runs, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares the full-text search of tracks with LOWER(...) LIKE')
+    parser.add_argument('--words', default=','.join(WORDS), help='comma separated words')
+    parser.add_argument('--runs', type=int, default=RUNS)
+    args = parser.parse_args()
+
+    connection = psycopg2.connect(database=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT)
+    with connection.cursor() as cur:
+        cur.execute('SELECT count(*) FROM tracks')
+        print(f'Треков: {cur.fetchone()[0]}')
+        print(f'{"word":<12} {"like page, ms":>14} {"fts page, ms":>13} {"like count, ms":>15} {"fts count, ms":>14} '
+              f'{"like rows":>10} {"fts rows":>9}')
+        for word in args.words.split(','):
+            row = [word]
+            for like in [True, False]:
+                row.append(measure(lambda: search(cur, word, like=like), args.runs)[0])
+
+            def count(query):
+                cur.execute(query, (word,))
+                return cur.fetchone()[0]
+
+            counts = [measure(lambda: count(COUNT_QUERIES[kind]), args.runs) for kind in ['like', 'fts']]
+            row += [elapsed for elapsed, _ in counts] + [rows for _, rows in counts]
+            print(f'{row[0]:<12} {row[1]:>14.2f} {row[2]:>13.2f} {row[3]:>15.2f} {row[4]:>14.2f} '
+                  f'{row[5]:>10} {row[6]:>9}')
+    connection.close()
@@ -0,0 +1,261 @@
+import collections
+import numpy as np
+import psycopg2
+
+# table -> (id column, other columns), rows are loaded in id order and appended after the id high-water mark
+TABLES = {
+    'albums': ('album_id', ['album_title', 'album_year']),
+    'tracks': ('track_id', ['track_title', 'duration', 'album_id']),
+    'artists': ('artist_id', ['alias']),
+    'genres': ('genre_id', ['genre_title']),
+    'collections': ('collection_id', ['collection_title', 'collection_year']),
+}
+# link table -> (table of the first column, table of the second column), link tables have no ids and are reloaded
+LINKS = {
+    'album_artists': ('albums', 'artists'),
+    'artist_genres': ('artists', 'genres'),
+    'collection_tracks': ('collections', 'tracks'),
+}
+TEXT_COLUMNS = {'album_title', 'track_title', 'alias', 'genre_title', 'collection_title'}
+# number of rows written to each table since the statistics reset, unchanged counters mean the table was not changed
+WRITE_COUNTERS = '''
+    SELECT relname, n_tup_ins + n_tup_upd + n_tup_del FROM pg_stat_user_tables WHERE relname = ANY(%s)
+'''
+
+
+def link_columns(link: str):
+    return [TABLES[table][0] for table in LINKS[link]]
+
+
+def csr(rows: np.ndarray, columns: np.ndarray, size: int):
+    """
+    :param rows: row index of each edge
+    :param columns: column index of each edge
+    :param size: number of rows
+    :return: (indptr, indices), the columns of row i are indices[indptr[i]:indptr[i + 1]]
+    """
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=size), out=indptr[1:])
+    return indptr, columns[np.argsort(rows, kind='stable')]
+
+
+def gather(adjacency: tuple, nodes: np.ndarray):
+    """
+    :param adjacency: (indptr, indices)
+    :param nodes: row indexes
+    :return: concatenated columns of the rows
+    """
+    indptr, indices = adjacency
+    starts = indptr[nodes]
+    lengths = indptr[nodes + 1] - starts
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+    return indices[offsets]
+
+
+class Catalogue:
+    def __init__(self, connection: psycopg2.extensions.connection):
+        """
+        :param connection: psycopg2 connection to the music database (scheme_init.sql), it should not be
+        in a transaction when refresh is called
+        """
+        self.connection = connection
+        self.columns = {table: None for table in [*TABLES, *LINKS]}
+        self.signatures = {table: (0, 0) for table in [*TABLES, *LINKS]}
+        self.high_water_marks = {table: 0 for table in TABLES}
+        self.write_counters = {}
+        self.refresh()
+
+    def _signature(self, cur, table: str):
+        """
+        :return: (count, xmin sum) of the rows up to the high-water mark and (count, xmin sum) of all rows,
+        the sum changes when a row is inserted, updated or deleted, because a written row gets the transaction ID
+        """
+        key = TABLES[table][0] if table in TABLES else None
+        loaded = f'FILTER (WHERE {key} <= %(hwm)s)' if key else ''
+        cur.execute(f'''
+            SELECT count(*) {loaded}, COALESCE(sum(xmin::text::bigint) {loaded}, 0),
+                count(*), COALESCE(sum(xmin::text::bigint), 0)
+            FROM {table}
+        ''', {'hwm': self.high_water_marks.get(table)})
+        row = cur.fetchone()
+        return (int(row[0]), int(row[1])), (int(row[2]), int(row[3]))
+
+    def _read(self, cur, table: str, after_id: int = 0):
+        """
+        :return: {column: array} of the rows of an entity table with ID greater than after_id in ID order,
+        or of all the rows of a link table; a missing album of a track is 0
+        """
+        if table in LINKS:
+            columns = link_columns(table)
+            cur.execute(f'SELECT {", ".join(columns)} FROM {table}')
+        else:
+            key, columns = TABLES[table]
+            columns = [key, *columns]
+            cur.execute(f'SELECT {", ".join(columns)} FROM {table} WHERE {key} > %s ORDER BY {key}', (after_id,))
+        values = list(zip(*cur.fetchall())) or [()] * len(columns)
+        return {
+            column: np.array(value, dtype=object) if column in TEXT_COLUMNS
+            else np.array([item or 0 for item in value], dtype=np.int64)
+            for column, value in zip(columns, values)
+        }
+
+    def refresh(self, use_counters: bool = True):
+        """
+        :param use_counters: skip the tables with the same write counters as on the previous refresh without reading
+        them (the statistics are sent with a delay, so a change just committed may be read on the next refresh)
+        :return: reads the changes from the database in one REPEATABLE READ snapshot and rebuilds the indexes,
+        returns {table: 'appended N' | 'reloaded N' | 'unchanged'}; the new rows of the entity tables are appended
+        after the id high-water mark, a table is reloaded if its loaded rows were changed or deleted
+        (found by the signature of the rows), the link tables are reloaded when they were changed
+        """
+        result = {}
+        tables = [*TABLES, *LINKS]
+        # the counters are read before the snapshot, so the counted changes are visible in it
+        with self.connection, self.connection.cursor() as cur:
+            cur.execute(WRITE_COUNTERS, (tables,))
+            write_counters = dict(cur.fetchall())
+        with self.connection, self.connection.cursor() as cur:
+            cur.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+            for table in tables:
+                if use_counters and self.columns[table] is not None \
+                        and write_counters.get(table) == self.write_counters.get(table):
+                    result[table] = 'unchanged'
+                    continue
+                loaded, current = self._signature(cur, table)
+                if current == self.signatures[table] and self.columns[table] is not None:
+                    result[table] = 'unchanged'
+                    continue
+                if table in TABLES and loaded == self.signatures[table] and self.columns[table] is not None:
+                    rows = self._read(cur, table, self.high_water_marks[table])
+                    self.columns[table] = {
+                        column: np.concatenate([values, rows[column]]) for column, values in self.columns[table].items()
+                    }
+                    result[table] = f'appended {len(rows[TABLES[table][0]])}'
+                else:
+                    self.columns[table] = self._read(cur, table)
+                    result[table] = f'reloaded {current[0]}'
+                if table in TABLES:
+                    ids = self.columns[table][TABLES[table][0]]
+                    self.high_water_marks[table] = int(ids[-1]) if len(ids) else 0
+                self.signatures[table] = current
+        self.write_counters = write_counters
+        if any(state != 'unchanged' for state in result.values()):
+            self._build()
+        return result
+
+    def _encode(self, table: str, ids: np.ndarray):
+        """
+        :return: positions of the ids in the table (-1 for missing ones)
+        """
+        table_ids = self.columns[table][TABLES[table][0]]
+        if not len(table_ids):
+            return np.full(len(ids), -1, dtype=np.int64)
+        positions = np.searchsorted(table_ids, ids)
+        found = table_ids[np.minimum(positions, len(table_ids) - 1)] == ids
+        return np.where(found, positions, -1)
+
+    def _adjacency(self, link: str):
+        """
+        :return: (adjacency of the first table to the second, adjacency of the second table to the first)
+        """
+        rows = [self._encode(table, self.columns[link][column])
+                for table, column in zip(LINKS[link], link_columns(link))]
+        valid = (rows[0] >= 0) & (rows[1] >= 0)
+        rows = [row[valid] for row in rows]
+        sizes = [len(self.columns[table][TABLES[table][0]]) for table in LINKS[link]]
+        return csr(rows[0], rows[1], sizes[0]), csr(rows[1], rows[0], sizes[1])
+
+    def _build(self):
+        """
+        :return: encodes the ids as positions, builds the adjacency lists and the per-album and per-track aggregates
+        """
+        albums, tracks, artists = self.columns['albums'], self.columns['tracks'], self.columns['artists']
+        self.track_album = self._encode('albums', tracks['album_id'])
+        with_album = self.track_album >= 0
+        album_count = len(albums['album_id'])
+        self.album_tracks = csr(self.track_album[with_album], np.flatnonzero(with_album), album_count)
+        self.album_artists, self.artist_albums = self._adjacency('album_artists')
+        self.artist_genres, self.genre_artists = self._adjacency('artist_genres')
+        self.collection_tracks, self.track_collections = self._adjacency('collection_tracks')
+
+        self.album_track_count = np.diff(self.album_tracks[0])
+        self.album_duration = np.bincount(self.track_album[with_album], weights=tracks['duration'][with_album],
+                                          minlength=album_count)
+        self.albums_by_title = np.argsort(albums['album_title'], kind='stable')
+        duration = tracks['duration']
+        self.shortest_tracks = np.flatnonzero(duration == duration.min()) if len(duration) else duration
+        self.artists_by_alias = collections.defaultdict(list)
+        for position, alias in enumerate(artists['alias']):
+            self.artists_by_alias[alias].append(position)
+
+    def genre_artist_counts(self):
+        """
+        :return: list of (genre title, number of artists) ordered by the number descending
+        """
+        counts = np.diff(self.genre_artists[0])
+        order = np.argsort(-counts, kind='stable')
+        return list(zip(self.columns['genres']['genre_title'][order].tolist(), counts[order].tolist()))
+
+    def album_years_track_count(self, years: list):
+        """
+        :return: number of tracks in the albums of the years
+        """
+        return int(self.album_track_count[np.isin(self.columns['albums']['album_year'], years)].sum())
+
+    def album_average_durations(self):
+        """
+        :return: list of (album title, average track duration) of the albums with tracks ordered by title
+        """
+        albums = self.albums_by_title[self.album_track_count[self.albums_by_title] > 0]
+        averages = self.album_duration[albums] / self.album_track_count[albums]
+        return list(zip(self.columns['albums']['album_title'][albums].tolist(), averages.tolist()))
+
+    def artists_without_albums(self, year: int):
+        """
+        :return: aliases of the artists without albums of the year
+        """
+        albums = np.flatnonzero(self.columns['albums']['album_year'] == year)
+        has_albums = np.zeros(len(self.columns['artists']['artist_id']), dtype=bool)
+        has_albums[gather(self.album_artists, albums)] = True
+        return self.columns['artists']['alias'][~has_albums].tolist()
+
+    def artist_collections(self, alias: str):
+        """
+        :return: titles of the collections with the tracks of the artist
+        """
+        artists = np.array(self.artists_by_alias.get(alias, []), dtype=np.int64)
+        tracks = gather(self.album_tracks, np.unique(gather(self.artist_albums, artists)))
+        found = np.unique(gather(self.track_collections, tracks))
+        return self.columns['collections']['collection_title'][found].tolist()
+
+    def multi_genre_artist_albums(self):
+        """
+        :return: titles of the albums of the artists with more than one genre (each album once)
+        """
+        artists = np.flatnonzero(np.diff(self.artist_genres[0]) > 1)
+        albums = np.unique(gather(self.artist_albums, artists))
+        return self.columns['albums']['album_title'][albums].tolist()
+
+    def tracks_without_collections(self):
+        """
+        :return: titles of the tracks not included in any collection
+        """
+        return self.columns['tracks']['track_title'][np.diff(self.track_collections[0]) == 0].tolist()
+
+    def shortest_track_artists(self):
+        """
+        :return: aliases of the artists of the shortest tracks (each artist once)
+        """
+        albums = self.track_album[self.shortest_tracks]
+        artists = np.unique(gather(self.album_artists, albums[albums >= 0]))
+        return self.columns['artists']['alias'][artists].tolist()
+
+    def fewest_track_albums(self):
+        """
+        :return: titles of the albums with the least number of tracks (albums without tracks are skipped)
+        """
+        counts = self.album_track_count
+        if not counts.any():
+            return []
+        fewest = counts[counts > 0].min()
+        return self.columns['albums']['album_title'][counts == fewest].tolist()
@@ -0,0 +1,116 @@
+import argparse
+import os
+import psycopg2
+
+DB_NAME = os.getenv('DB_NAME') or 'music'
+DB_USER = os.getenv('DB_USER') or 'postgres'
+DB_PASSWORD = os.getenv('DB_PASSWORD') or 'postgres'
+DB_HOST = os.getenv('DB_HOST') or 'localhost'
+DB_PORT = os.getenv('DB_PORT') or 5432
+PAGE_SIZE = 10
+
+# kind -> ranked full-text query over the columns of scheme_search.sql,
+# rows are (id, title, details, rank) where details is the album title for tracks and the year otherwise;
+# all matches are ranked, so the page is selected before joining the details
+SEARCH_QUERIES = {
+    'tracks': '''
+        SELECT t.track_id, t.track_title, a.album_title, t.rank
+        FROM (
+            SELECT track_id, track_title, album_id, ts_rank(track_tsv, q) AS rank
+            FROM tracks, search_query(%(text)s) q
+            WHERE track_tsv @@ q
+            ORDER BY rank DESC, track_id
+            LIMIT %(limit)s OFFSET %(offset)s
+        ) t
+        LEFT JOIN albums a ON a.album_id = t.album_id
+        ORDER BY t.rank DESC, t.track_id
+    ''',
+    'albums': '''
+        SELECT album_id, album_title, album_year, ts_rank(album_tsv, q) AS rank
+        FROM albums, search_query(%(text)s) q
+        WHERE album_tsv @@ q
+        ORDER BY rank DESC, album_id
+        LIMIT %(limit)s OFFSET %(offset)s
+    ''',
+    'collections': '''
+        SELECT collection_id, collection_title, collection_year, ts_rank(collection_tsv, q) AS rank
+        FROM collections, search_query(%(text)s) q
+        WHERE collection_tsv @@ q
+        ORDER BY rank DESC, collection_id
+        LIMIT %(limit)s OFFSET %(offset)s
+    ''',
+}
+# substring search as in selections.sql before scheme_search.sql, kept for comparison
+LIKE_QUERIES = {
+    'tracks': '''
+        SELECT t.track_id, t.track_title, a.album_title, 0 AS rank
+        FROM tracks t
+        LEFT JOIN albums a ON a.album_id = t.album_id
+        WHERE LOWER(t.track_title) LIKE '%%' || LOWER(%(text)s) || '%%'
+        ORDER BY t.track_id
+        LIMIT %(limit)s OFFSET %(offset)s
+    ''',
+    'albums': '''
+        SELECT album_id, album_title, album_year, 0 AS rank FROM albums
+        WHERE LOWER(album_title) LIKE '%%' || LOWER(%(text)s) || '%%'
+        ORDER BY album_id
+        LIMIT %(limit)s OFFSET %(offset)s
+    ''',
+    'collections': '''
+        SELECT collection_id, collection_title, collection_year, 0 AS rank FROM collections
+        WHERE LOWER(collection_title) LIKE '%%' || LOWER(%(text)s) || '%%'
+        ORDER BY collection_id
+        LIMIT %(limit)s OFFSET %(offset)s
+    ''',
+}
+
+
+def search(cursor: psycopg2.extensions.cursor, text: str, kind: str = 'tracks', page: int = 1,
+           page_size: int = PAGE_SIZE, like: bool = False):
+    """
+    :param cursor: psycopg2 cursor
+    :param text: words to search, all of them should be in the title (in any form for russian and english words)
+    :param kind: tracks, albums or collections
+    :param page: page number starting from 1
+    :param page_size: number of results on a page
+    :param like: use the substring search instead of the full-text search
+    :return: (list of (id, title, details, rank) ordered by rank, True if there is a next page)
+    """
+    queries = LIKE_QUERIES if like else SEARCH_QUERIES
+    if kind not in queries:
+        raise Exception(f'Unknown parameter {kind}')
+    cursor.execute(queries[kind], {'text': text, 'limit': page_size + 1, 'offset': (page - 1) * page_size})
+    rows = cursor.fetchall()
+    return rows[:page_size], len(rows) > page_size
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Searches tracks, albums or collections by title')
+    parser.add_argument('text')
+    parser.add_argument('--kind', choices=list(SEARCH_QUERIES), default='tracks')
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE)
+    args = parser.parse_args()
+
+    connection = psycopg2.connect(database=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT)
+    page = 1
+    with connection.cursor() as cur:
+        while True:
+            results, has_next_page = search(cur, args.text, args.kind, page, args.page_size)
+            if not results and page == 1:
+                print('Ничего не найдено')
+                break
+            print(f'Страница {page}:')
+            for item_id, title, details, rank in results:
+                print(f'{item_id}. {title} [{details}] ({rank:.3f})')
+            if page > 1:
+                print('<. Предыдущая страница')
+            if has_next_page:
+                print('>. Следующая страница')
+            user_choice = input('введите < или > для перехода, иначе выход: ')
+            if user_choice == '<' and page > 1:
+                page -= 1
+            elif user_choice == '>' and has_next_page:
+                page += 1
+            else:
+                break
+    connection.close()
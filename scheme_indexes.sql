@@ -0,0 +1,43 @@
+/* индексы и материализованные представления для выборок из advanced_selections.sql,
+   выполняется после scheme_init.sql вне транзакции (CREATE INDEX CONCURRENTLY не блокирует запись в таблицы) */
+
+/* внешние ключи, по которым соединяются таблицы (первые столбцы составных первичных ключей уже проиндексированы) */
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tracks_album_id ON tracks (album_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_album_artists_artist_id ON album_artists (artist_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_artist_genres_genre_id ON artist_genres (genre_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_collection_tracks_track_id ON collection_tracks (track_id);
+
+/* отбор альбомов по году и поиск самого короткого трека */
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_albums_album_year ON albums (album_year);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tracks_duration ON tracks (duration);
+
+/* статистика альбомов: количество треков, общая и средняя продолжительность (альбомы без треков тоже включены) */
+CREATE MATERIALIZED VIEW IF NOT EXISTS album_stats AS
+SELECT a.album_id, a.album_title, a.album_year, count(t.track_id) track_count,
+	COALESCE(sum(t.duration), 0) total_duration, AVG(t.duration) avg_duration
+FROM albums a
+LEFT JOIN tracks t ON t.album_id = a.album_id
+GROUP BY a.album_id;
+
+/* уникальный индекс нужен для REFRESH MATERIALIZED VIEW CONCURRENTLY */
+CREATE UNIQUE INDEX IF NOT EXISTS ux_album_stats_album_id ON album_stats (album_id);
+CREATE INDEX IF NOT EXISTS ix_album_stats_album_year ON album_stats (album_year);
+CREATE INDEX IF NOT EXISTS ix_album_stats_track_count ON album_stats (track_count);
+
+/* количество исполнителей в каждом жанре (жанры без исполнителей тоже включены) */
+CREATE MATERIALIZED VIEW IF NOT EXISTS genre_artist_counts AS
+SELECT g.genre_id, g.genre_title, count(ag.artist_id) artist_count
+FROM genres g
+LEFT JOIN artist_genres ag ON ag.genre_id = g.genre_id
+GROUP BY g.genre_id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_genre_artist_counts_genre_id ON genre_artist_counts (genre_id);
+
+/* обновление представлений после изменения данных без блокировки чтения: CALL refresh_catalogue_views(); */
+CREATE OR REPLACE PROCEDURE refresh_catalogue_views()
+LANGUAGE plpgsql AS $$
+BEGIN
+	REFRESH MATERIALIZED VIEW CONCURRENTLY album_stats;
+	REFRESH MATERIALIZED VIEW CONCURRENTLY genre_artist_counts;
+END;
+$$;
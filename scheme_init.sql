@@ -1,3 +1,5 @@
+DROP MATERIALIZED VIEW IF EXISTS album_stats;
+DROP MATERIALIZED VIEW IF EXISTS genre_artist_counts;
 DROP TABLE IF EXISTS album_artists;
 DROP TABLE IF EXISTS artist_genres;
 DROP TABLE IF EXISTS collection_tracks;
@@ -0,0 +1,26 @@
+/* полнотекстовый поиск по названиям треков, альбомов и сборников, выполняется после scheme_init.sql вне транзакции;
+   в документ входят формы слов по словарям russian и english и сами слова (simple), так как "мой"/"my"
+   и другие короткие слова являются стоп-словами этих словарей */
+
+ALTER TABLE tracks ADD COLUMN IF NOT EXISTS track_tsv tsvector GENERATED ALWAYS AS (
+	to_tsvector('russian', track_title) || to_tsvector('english', track_title) || to_tsvector('simple', track_title)
+) STORED;
+
+ALTER TABLE albums ADD COLUMN IF NOT EXISTS album_tsv tsvector GENERATED ALWAYS AS (
+	to_tsvector('russian', album_title) || to_tsvector('english', album_title) || to_tsvector('simple', album_title)
+) STORED;
+
+ALTER TABLE collections ADD COLUMN IF NOT EXISTS collection_tsv tsvector GENERATED ALWAYS AS (
+	to_tsvector('russian', collection_title) || to_tsvector('english', collection_title)
+		|| to_tsvector('simple', collection_title)
+) STORED;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tracks_track_tsv ON tracks USING GIN (track_tsv);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_albums_album_tsv ON albums USING GIN (album_tsv);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_collections_collection_tsv ON collections USING GIN (collection_tsv);
+
+/* запрос по тем же словарям, слова объединяются по И, словари - по ИЛИ: track_tsv @@ search_query('мой') */
+CREATE OR REPLACE FUNCTION search_query(text) RETURNS tsquery
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+	SELECT plainto_tsquery('russian', $1) || plainto_tsquery('english', $1) || plainto_tsquery('simple', $1)
+$$;
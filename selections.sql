@@ -18,6 +18,6 @@ WHERE album_year IN (2018, 2019, 2020);
 SELECT alias FROM artists
 WHERE alias NOT LIKE '% %';
 
-/* название треков, которые содержат слово "мой"/"my" */
+/* название треков, которые содержат слово "мой"/"my" (полнотекстовый поиск из scheme_search.sql) */
 SELECT track_title FROM tracks
-WHERE LOWER(track_title) LIKE '%мой%' OR LOWER(track_title) LIKE '%my%';
+WHERE track_tsv @@ (search_query('мой') || search_query('my'));
@@ -0,0 +1 @@
+from .registry import Registry, Histogram, REGISTRY, BUCKETS, normalize
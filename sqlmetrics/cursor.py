@@ -0,0 +1,48 @@
+import time
+import psycopg2.extensions
+from .registry import Registry, REGISTRY
+
+
+class MetricsCursor(psycopg2.extensions.cursor):
+    """
+    psycopg2 cursor reporting the statements to the registry
+    """
+    registry = REGISTRY
+    # statement reported for the next call instead of the executed one,
+    # e.g. the query of a prepared statement instead of EXECUTE name
+    reported_statement = None
+
+    def _observe(self, method, query, *args):
+        started = time.perf_counter()
+        if self.reported_statement is not None:
+            statement, self.reported_statement = self.reported_statement, None
+        elif isinstance(query, bytes):
+            statement = query.decode(psycopg2.extensions.encodings[self.connection.encoding], 'replace')
+        elif isinstance(query, str):
+            statement = query
+        else:
+            statement = query.as_string(self)
+        try:
+            result = method(query, *args)
+        except Exception:
+            self.registry.observe(statement, time.perf_counter() - started, error=True)
+            raise
+        self.registry.observe(statement, time.perf_counter() - started, self.rowcount)
+        return result
+
+    def execute(self, query, vars=None):
+        return self._observe(super().execute, query, vars)
+
+    def executemany(self, query, vars_list):
+        return self._observe(super().executemany, query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        return self._observe(super().copy_expert, sql, file, size)
+
+
+def metrics_cursor_factory(registry: Registry = REGISTRY):
+    """
+    :param registry: registry receiving the statements
+    :return: cursor class for the cursor_factory parameter of psycopg2.connect or connection.cursor
+    """
+    return type('MetricsCursor', (MetricsCursor,), {'registry': registry})
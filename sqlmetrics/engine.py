@@ -0,0 +1,26 @@
+import time
+import sqlalchemy
+from .registry import Registry, REGISTRY
+
+
+def instrument_engine(engine: sqlalchemy.engine.Engine, registry: Registry = REGISTRY):
+    """
+    :param engine: SQLAlchemy engine
+    :param registry: registry receiving the statements
+    :return: adds event listeners reporting every statement executed by the engine (and its sessions)
+    """
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault('sqlmetrics_started', []).append(time.perf_counter())
+
+    def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        started = connection.info['sqlmetrics_started'].pop()
+        registry.observe(statement, time.perf_counter() - started, cursor.rowcount)
+
+    def handle_error(context):
+        started = context.connection.info.get('sqlmetrics_started') if context.connection is not None else None
+        if started and context.statement is not None:
+            registry.observe(context.statement, time.perf_counter() - started.pop(), error=True)
+
+    sqlalchemy.event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    sqlalchemy.event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+    sqlalchemy.event.listen(engine, 'handle_error', handle_error)
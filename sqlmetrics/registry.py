@@ -0,0 +1,175 @@
+import bisect
+import logging
+import re
+import threading
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_STATEMENTS = 1000
+OTHER_STATEMENT = 'other'
+LITERALS = re.compile(r"""
+    '(?:[^']|'')*'                                  # string
+    | (?<![\w$])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?\b     # number
+    | %\(\w+\)s | %s | \$\d+ | (?<!:):\w+ | \?      # parameter placeholders
+""", re.X | re.I)
+LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+ROWS = re.compile(r'(?:\(\?\)\s*,\s*)+\(\?\)')
+SPACES = re.compile(r'\s+')
+
+
+def normalize(statement: str):
+    """
+    :param statement: SQL statement (with or without parameters)
+    :return: statement with literals and placeholders replaced by ?, lists and VALUES rows collapsed
+    and whitespace normalized, so the statements differing only by values have the same key
+    """
+    statement = LITERALS.sub('?', statement)
+    statement = LISTS.sub('(?)', statement)
+    statement = ROWS.sub('(?)', statement)
+    return SPACES.sub(' ', statement).strip().rstrip(';')
+
+
+class Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float):
+        """
+        :param q: quantile from 0 to 1
+        :return: upper bound of the bucket containing the quantile (inf if it is above the last bucket)
+        """
+        rank, total = q * self.count, 0
+        for bound, count in zip(BUCKETS + (float('inf'),), self.counts):
+            total += count
+            if total >= rank and count:
+                return bound
+        return 0.0
+
+
+class StatementStats:
+    __slots__ = ('duration', 'rows', 'errors')
+
+    def __init__(self):
+        self.duration = Histogram()
+        self.rows = 0
+        self.errors = 0
+
+
+class Registry:
+    def __init__(self, slow_threshold: float = None, logger: logging.Logger = None,
+                 max_statements: int = MAX_STATEMENTS):
+        """
+        :param slow_threshold: statements running longer (in seconds) are logged (None - disabled)
+        :param logger: logger of slow statements
+        :param max_statements: max number of distinct statements, the rest are counted as OTHER_STATEMENT
+        """
+        self.slow_threshold = slow_threshold
+        self.logger = logger or logging.getLogger('sqlmetrics')
+        self.max_statements = max_statements
+        self._statements = {}
+        self._lock = threading.Lock()
+
+    def observe(self, statement: str, duration: float, rows: int = 0, error: bool = False):
+        """
+        :param statement: executed SQL statement
+        :param duration: execution time in seconds
+        :param rows: number of returned or affected rows
+        :param error: True if the statement failed
+        :return: None
+        """
+        key = normalize(statement)
+        with self._lock:
+            stats = self._statements.get(key)
+            if stats is None:
+                if len(self._statements) >= self.max_statements:
+                    key = OTHER_STATEMENT
+                stats = self._statements.setdefault(key, StatementStats())
+            stats.duration.observe(duration)
+            stats.rows += max(rows or 0, 0)
+            stats.errors += bool(error)
+        if self.slow_threshold is not None and duration >= self.slow_threshold:
+            self.logger.warning('slow query (%.1f ms): %s', duration * 1000, statement)
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+
+    def stats(self):
+        """
+        :return: {statement: {'calls', 'total', 'avg', 'p50', 'p95', 'p99', 'rows', 'errors'}},
+        times in seconds, percentiles are bucket upper bounds
+        """
+        with self._lock:
+            return {
+                key: {
+                    'calls': stats.duration.count,
+                    'total': stats.duration.sum,
+                    'avg': stats.duration.sum / stats.duration.count if stats.duration.count else 0.0,
+                    'p50': stats.duration.quantile(0.5),
+                    'p95': stats.duration.quantile(0.95),
+                    'p99': stats.duration.quantile(0.99),
+                    'rows': stats.rows,
+                    'errors': stats.errors,
+                }
+                for key, stats in self._statements.items()
+            }
+
+    def dump(self, limit: int = None):
+        """
+        :param limit: max number of statements (None - all)
+        :return: text table of the statements ordered by total time
+        """
+        lines = [f'{"calls":>8} {"total, ms":>10} {"avg, ms":>9} {"p95, ms":>9} {"rows":>9} {"errors":>6}  statement']
+        items = sorted(self.stats().items(), key=lambda item: item[1]['total'], reverse=True)
+        for statement, stats in items[:limit]:
+            lines.append(
+                f'{stats["calls"]:>8} {stats["total"] * 1000:>10.1f} {stats["avg"] * 1000:>9.2f} '
+                f'{stats["p95"] * 1000:>9.1f} {stats["rows"]:>9} {stats["errors"]:>6}  {statement}'
+            )
+        return '\n'.join(lines)
+
+    def prometheus(self, prefix: str = 'sql'):
+        """
+        :param prefix: metric name prefix
+        :return: metrics in the Prometheus text exposition format
+        """
+        def label(value):
+            return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+        with self._lock:
+            items = [
+                (label(key), list(stats.duration.counts), stats.duration.sum, stats.duration.count, stats.rows,
+                 stats.errors)
+                for key, stats in self._statements.items()
+            ]
+        lines = [
+            f'# HELP {prefix}_statement_duration_seconds Statement execution time.',
+            f'# TYPE {prefix}_statement_duration_seconds histogram',
+        ]
+        for statement, counts, total, count, _, _ in items:
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS + (float('inf'),), counts):
+                cumulative += bucket
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{prefix}_statement_duration_seconds_bucket{{statement="{statement}",le="{le}"}} '
+                             f'{cumulative}')
+            lines.append(f'{prefix}_statement_duration_seconds_sum{{statement="{statement}"}} {total}')
+            lines.append(f'{prefix}_statement_duration_seconds_count{{statement="{statement}"}} {count}')
+        for name, index, description in [('rows', 4, 'Rows returned or affected.'),
+                                         ('errors', 5, 'Failed executions.')]:
+            lines.append(f'# HELP {prefix}_statement_{name}_total {description}')
+            lines.append(f'# TYPE {prefix}_statement_{name}_total counter')
+            for item in items:
+                lines.append(f'{prefix}_statement_{name}_total{{statement="{item[0]}"}} {item[index]}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()